@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "currencies_by_country.middleware.TimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -82,6 +84,41 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+# Кэши у каждого процесса свои. Версии данных, по которым строятся ключи кэшей,
+# хранятся в БД (таблица DataVersion) и общие для всех процессов
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Отрисованные графики: не больше MAX_ENTRIES штук, каждый живет TIMEOUT секунд
+    "charts": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "charts",
+        "TIMEOUT": 60 * 60,
+        "OPTIONS": {"MAX_ENTRIES": 200},
+    },
+}
+
+# Каталог дискового кэша ответов finmarket.ru и iban.ru (None - без кэша)
+HTTP_CACHE_DIR = BASE_DIR / "http_cache"
+
+# Каталог файла хранилища курсов ratestore, общего для процессов через mmap (None - читать курсы из БД)
+RATE_STORE_DIR = BASE_DIR / "rate_store"
+# Сколько секунд воркер не перечитывает версию данных о курсах при чтении хранилища
+RATE_STORE_VERSION_TTL = 1.0
+
+# Построение графиков: число процессов пула (0 - в потоке запроса),
+# предел задач в работе и очереди, время ожидания графика в секундах
+CHART_RENDER_WORKERS = min(4, os.cpu_count() or 1)
+CHART_RENDER_MAX_PENDING = 32
+CHART_RENDER_TIMEOUT = 30
+# Запускать процессы построения графиков при старте сервера (wsgi.py, asgi.py)
+CHART_RENDER_WARM_UP = True
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -16,13 +16,24 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from currencies_by_country.views import GetterCurrencies, MainPageForm
+from currencies_by_country.views import AsyncGetterCurrencies, GetterCurrencies, MainPageForm, Monitoring
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", GetterCurrencies.redirect_to_main),
     path("main/", MainPageForm.main_form, name='main_form'),
     path("main/coutries-and-rates", GetterCurrencies.get_countries_rates, name="coutries_and_rates"),
+    path("main/chart.png", GetterCurrencies.get_chart, name="chart"),
     path("api/GET/country-currency/", GetterCurrencies.get_currency_of_country),
     path("api/GET/currency-rates/", GetterCurrencies.get_rates),
+    path("api/GET/countries-rates/", GetterCurrencies.get_countries_rates_series, name="countries_rates_series"),
+    path("api/GET/changes-since/", GetterCurrencies.get_changes_since, name="changes_since"),
+    path("api/GET/cross-rates/", GetterCurrencies.get_cross_rates, name="cross_rates"),
+    path("api/GET/export/<str:table>.<str:fmt>", GetterCurrencies.export_table, name="export"),
+    path("metrics", Monitoring.metrics, name="metrics"),
+    # Асинхронные версии для запуска под ASGI (currencies/asgi.py)
+    path("async/main/coutries-and-rates", AsyncGetterCurrencies.get_countries_rates, name="async_coutries_and_rates"),
+    path("async/main/chart.png", AsyncGetterCurrencies.get_chart, name="async_chart"),
+    path("async/api/GET/country-currency/", AsyncGetterCurrencies.get_currency_of_country),
+    path("async/api/GET/currency-rates/", AsyncGetterCurrencies.get_rates, name="async_currency_rates"),
 ]
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "currencies.settings")
 
 application = get_wsgi_application()
+
+# Процессы построения графиков запускаются вместе с сервером, а не на первом запросе
+from currencies_by_country.rendering import start_renderer  # noqa: E402
+
+start_renderer()
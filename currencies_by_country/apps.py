@@ -4,3 +4,22 @@ from django.apps import AppConfig
 class CurrenciesByCountryConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "currencies_by_country"
+
+    def ready(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_migrate, post_save
+
+        from . import metrics, versions
+        from .models import CountryCodes, CurrencyRates
+
+        # SQL запросы считаются во всех соединениях, включая открытые до запуска приложения
+        connection_created.connect(metrics.install_sql_wrapper)
+        for connection in connections.all(initialized_only=True):
+            metrics.install_sql_wrapper(sender=None, connection=connection)
+
+        post_save.connect(versions.countries_changed, sender=CountryCodes)
+        post_delete.connect(versions.countries_changed, sender=CountryCodes)
+        post_save.connect(versions.rates_changed, sender=CurrencyRates)
+        post_delete.connect(versions.rates_changed, sender=CurrencyRates)
+        post_migrate.connect(versions.migrated, sender=self)
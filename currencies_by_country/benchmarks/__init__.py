@@ -0,0 +1,28 @@
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / 'testdata'
+
+
+def fixture(name: str) -> bytes:
+    '''
+    Takes: имя сохраненной html-страницы из testdata
+
+    Returns: содержимое страницы
+    '''
+    return (FIXTURES_DIR / name).read_bytes()
+
+
+def measure(func: Callable[..., Any], *args, repeat: int = 5) -> float:
+    '''
+    Takes: функция, ее аргументы и число повторов
+
+    Returns: лучшее время одного вызова в секундах
+    '''
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
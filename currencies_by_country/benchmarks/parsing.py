@@ -0,0 +1,103 @@
+from bs4 import BeautifulSoup
+import pandas as pd
+
+from currencies_by_country import scrapers
+
+from . import fixture, measure
+
+RATES_PAGES = {
+    '1m': 'finmarket_archive_1m.html',
+    '1y': 'finmarket_archive_1y.html',
+    '2y': 'finmarket_archive_2y.html',
+}
+
+
+def bs4_parse_rates_page(content: bytes) -> pd.DataFrame:
+    '''
+    Прежний разбор архива курсов: дерево BeautifulSoup, поиск индексов колонок
+    на каждой строке и перевод дат и курсов в pandas отдельным проходом
+    '''
+    soup = BeautifulSoup(content, "html.parser", from_encoding='utf-8')
+
+    head = soup.find("thead").find_all('th')
+    head = list(map(lambda x: x.text, head))
+
+    current_course = list(
+        map(
+            lambda x: x.find_all('td'),
+            soup.find("table", {'class': 'karramba'}).find('tbody').find_all("tr")
+            )
+        )
+
+    date = list(map(lambda x: x[head.index('Дата')].text, current_course))
+    current_course = list(map(lambda x: x[head.index('Курс')].text, current_course))
+
+    df = pd.DataFrame({'date': date, 'rate': current_course})
+    df['rate'] = (df['rate'].str.replace(r'\s', '', regex=True)
+                            .str.replace(',', '.')
+                            .astype(float))
+    df['date'] = pd.to_datetime(df['date'], format='%d.%m.%Y').dt.date
+    return df
+
+
+def bs4_parse_country_codes_page(content: bytes) -> pd.DataFrame:
+    '''
+    Прежний разбор страницы кодов валют стран через BeautifulSoup
+    '''
+    soup = BeautifulSoup(content, "html.parser", from_encoding='utf-8')
+
+    head = list(
+        map(lambda x: x.text,
+            soup.find('table').find('thead').find_all('th'))
+        )
+
+    currency_of_country = soup.find('table').find('tbody').find_all('tr')
+    currency_of_country = list(
+        map(lambda x: x.find_all('td'),
+            currency_of_country)
+        )
+
+    dict_country_currency = {column: list(
+        map(
+            lambda x: x[head.index(column)].text,
+            currency_of_country
+            )
+        ) for column in head}
+
+    df = pd.DataFrame(dict_country_currency).sort_values('Страна', ignore_index=True)
+    df = df[df['Код'] != '']
+    return df
+
+
+def lxml_parse_rates_page(content: bytes) -> pd.DataFrame:
+    '''
+    Текущий разбор архива курсов через tables.rates_table, вместе со сборкой DataFrame
+    '''
+    return scrapers.rates_frame(['USD'], [scrapers.parse_rates_page(content)])
+
+
+def run(repeat: int = 5) -> list[dict]:
+    '''
+    Takes: число повторов каждого замера
+
+    Returns: список замеров с полями name, rows, bs4, lxml (секунды) и speedup
+    '''
+    cases = [
+        (f'rates_{scale}', fixture(name), bs4_parse_rates_page, lxml_parse_rates_page)
+        for scale, name in RATES_PAGES.items()
+    ]
+    cases.append(('country_codes', fixture('iban_currency_codes.html'),
+                  bs4_parse_country_codes_page, scrapers.parse_country_codes_page))
+
+    results = []
+    for name, content, old, new in cases:
+        old_time = measure(old, content, repeat=repeat)
+        new_time = measure(new, content, repeat=repeat)
+        results.append({
+            'name': name,
+            'rows': len(new(content)),
+            'bs4': old_time,
+            'lxml': new_time,
+            'speedup': old_time / new_time,
+        })
+    return results
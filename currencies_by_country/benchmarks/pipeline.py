@@ -0,0 +1,133 @@
+import datetime
+import time
+from typing import Any, Callable
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.db import connection, transaction
+import pandas as pd
+
+from currencies_by_country import fetching, rendering, scrapers, services
+from currencies_by_country.constants import CHART_MAX_POINTS, TRANS_CODES
+from currencies_by_country.models import CountryCodes
+
+from . import fixture, measure
+from .stub import StubServer
+
+# Масштаб -> число дней интервала и сохраненная страница архива
+SCALES = {
+    '1m': (30, 'finmarket_archive_1m.html'),
+    '1y': (365, 'finmarket_archive_1y.html'),
+    '2y': (730, 'finmarket_archive_2y.html'),
+}
+
+STAGES = ['scrape', 'parse', 'upsert', 'changes_since', 'chart_series', 'render']
+
+
+def scale_rates(scale: str) -> pd.DataFrame:
+    '''
+    Returns: курсы всех отслеживаемых валют масштаба scale из сохраненной страницы архива
+    '''
+    dates, rates = scrapers.parse_rates_page(fixture(SCALES[scale][1]))
+    return pd.concat(
+        [pd.DataFrame({'currency_code': code, 'date': dates, 'rate': rates * (1 + number / 10)})
+         for number, code in enumerate(TRANS_CODES)],
+        ignore_index=True,
+    )
+
+
+def measure_in_transaction(func: Callable[[], Any], prepare: Callable[[], Any] | None = None,
+                           repeat: int = 5) -> tuple[float, Any]:
+    '''
+    Takes: замеряемая функция, необязательная подготовка данных и число повторов
+
+    Returns: лучшее время одного вызова в секундах и результат последнего вызова
+
+    Каждый повтор выполняется в транзакции, которая затем откатывается,
+    поэтому замеры не меняют БД и не зависят друг от друга
+    '''
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        with transaction.atomic():
+            if prepare is not None:
+                prepare()
+            started = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - started)
+            transaction.set_rollback(True)
+    return best, result
+
+
+def run_scale(scale: str, server: StubServer, repeat: int = 5) -> list[dict]:
+    '''
+    Takes: масштаб из SCALES, запущенный сервер сохраненных страниц, число повторов
+
+    Returns: замеры этапов STAGES для масштаба: словари с полями name, stage, scale, rows, seconds
+    '''
+    days, page = SCALES[scale]
+    content = fixture(page)
+    df = scale_rates(scale)
+    start, end = min(df['date']), max(df['date'])
+    countries = [f'Страна {code}' for code in TRANS_CODES]
+
+    def scrape() -> pd.DataFrame:
+        # Без дискового кэша и кэша кодов валют, чтобы каждый повтор ходил на сервер
+        caches['default'].delete(scrapers.CURRENCY_URL_CODES_KEY)
+        fetcher = fetching.Fetcher(backoff_factor=0.01)
+        with patch.object(scrapers, 'FINMARKET_RATES_URL', server.url), \
+                patch.object(scrapers, 'get_fetcher', return_value=fetcher):
+            return scrapers.scrape_rates(end - datetime.timedelta(days=days - 1), end)
+
+    def save_data():
+        services.save_rates(df)
+        CountryCodes.objects.bulk_create(
+            CountryCodes(country=country, currency=code, code=code, number='0')
+            for country, code in zip(countries, TRANS_CODES)
+        )
+
+    seconds = {
+        'scrape': measure(scrape, repeat=repeat),
+        'parse': measure(scrapers.parse_rates_page, content, repeat=repeat),
+        'upsert': measure_in_transaction(lambda: services.save_rates(df), repeat=repeat)[0],
+        'changes_since': measure_in_transaction(
+            lambda: services.get_changes_since(start, end, list(TRANS_CODES)), save_data, repeat)[0],
+    }
+    seconds['chart_series'], changes = measure_in_transaction(
+        lambda: services.get_relative_changes(countries, start, end, CHART_MAX_POINTS), save_data, repeat)
+    seconds['render'] = measure(rendering.render_chart, changes, repeat=repeat)
+
+    return [
+        {'name': f'{stage}_{scale}', 'stage': stage, 'scale': scale,
+         'rows': len(changes) if stage == 'render' else len(df), 'seconds': seconds[stage]}
+        for stage in STAGES
+    ]
+
+
+def run(scales: list[str] | None = None, repeat: int = 5) -> list[dict]:
+    '''
+    Takes: масштабы из SCALES (по умолчанию все) и число повторов каждого замера
+
+    Returns: замеры всех этапов для всех масштабов в формате run_scale
+
+    Замеры выполняются во временной тестовой БД, рабочая БД не читается и не меняется
+    '''
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with StubServer() as server:
+            return [result for scale in scales or SCALES for result in run_scale(scale, server, repeat)]
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def compare(results: list[dict], baseline: dict[str, float], tolerance: float) -> list[dict]:
+    '''
+    Takes: замеры, базовые времена name -> секунды и допустимое замедление (0.25 - на 25%)
+
+    Returns: замеры, которые медленнее базовых больше чем на tolerance, с полями baseline и ratio
+    '''
+    regressions = []
+    for result in results:
+        base = baseline.get(result['name'])
+        if base and result['seconds'] > base * (1 + tolerance):
+            regressions.append({**result, 'baseline': base, 'ratio': result['seconds'] / base})
+    return regressions
@@ -0,0 +1,68 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+
+# Модули, которые нужны только при обработке запросов и не должны грузиться при старте
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib', 'bs4', 'lxml', 'requests', 'httpx')
+
+# Что импортирует процесс: старт воркера (urls) и старт воркера с прежним
+# импортом всего при загрузке views - scrapers, services, charts и matplotlib
+SCENARIOS = {
+    'lazy': [],
+    'eager': ['currencies_by_country.scrapers', 'currencies_by_country.services',
+              'currencies_by_country.charts', 'matplotlib.figure', 'matplotlib.backends.backend_agg'],
+}
+
+SCRIPT = '''
+import importlib, json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+import currencies.urls
+for name in sys.argv[2:]:
+    importlib.import_module(name)
+seconds = time.perf_counter() - started
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss = rss / 1024 if sys.platform != 'darwin' else rss / 1024 / 1024
+except ImportError:
+    rss = None
+print(json.dumps({'seconds': seconds, 'rss_mb': rss,
+                  'heavy': [name for name in json.loads(sys.argv[1]) if name in sys.modules]}))
+'''
+
+
+def measure_startup(modules: list[str]) -> dict:
+    '''
+    Takes: модули, которые импортируются после загрузки urls
+
+    Returns: время старта в секундах, пиковая память процесса (МБ, None без модуля resource)
+    и загруженные модули из HEAVY_MODULES. Замер идет в новом процессе интерпретатора,
+    чтобы ничего не было импортировано заранее
+    '''
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE',
+                                                                 'currencies.settings'))
+    output = subprocess.run(
+        [sys.executable, '-c', SCRIPT, json.dumps(HEAVY_MODULES), *modules],
+        capture_output=True, check=True, cwd=settings.BASE_DIR, env=env, text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def run(repeat: int = 5) -> list[dict]:
+    '''
+    Takes: число повторов каждого сценария
+
+    Returns: для каждого сценария SCENARIOS лучшее время старта, пиковую память
+    и загруженные тяжелые модули
+    '''
+    results = []
+    for name, modules in SCENARIOS.items():
+        runs = [measure_startup(modules) for _ in range(repeat)]
+        best = min(runs, key=lambda result: result['seconds'])
+        results.append({'name': name, **best})
+    return results
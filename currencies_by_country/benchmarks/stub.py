@@ -0,0 +1,64 @@
+import datetime
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from . import fixture
+
+# Страница архива для интервала: не длиннее month дней - 1m, не длиннее year - 1y, иначе 2y
+ARCHIVE_FIXTURES = (
+    (31, 'finmarket_archive_1m.html'),
+    (366, 'finmarket_archive_1y.html'),
+    (None, 'finmarket_archive_2y.html'),
+)
+
+
+def archive_fixture(query: dict[str, list[str]]) -> str:
+    '''
+    Takes: параметры запроса архива finmarket.ru
+
+    Returns: имя сохраненной страницы архива подходящей длины
+    '''
+    start = datetime.date(*(int(query[name][0]) for name in ('by', 'bm', 'bd')))
+    end = datetime.date(*(int(query[name][0]) for name in ('ey', 'em', 'ed')))
+    for days, name in ARCHIVE_FIXTURES:
+        if days is None or (end - start).days + 1 <= days:
+            return name
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    '''
+    Отдает сохраненные страницы finmarket.ru: главную страницу архива
+    или архив курсов длины, соответствующей запрошенному интервалу
+    '''
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        name = archive_fixture(query) if 'cur' in query else 'finmarket_index.html'
+        body = fixture(name)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer:
+    '''
+    Локальный сервер с сохраненными страницами finmarket.ru для замеров без сети.
+    Используется как контекстный менеджер, url - адрес архива курсов
+    '''
+
+    def __enter__(self) -> 'StubServer':
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}/currency/rates/'
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
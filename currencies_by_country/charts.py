@@ -0,0 +1,111 @@
+import datetime
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics, rendering, services, versions
+from .constants import CHART_MAX_POINTS
+from .singleflight import SingleFlight
+
+# Одновременные промахи кэша по одному графику строят его один раз.
+# Кэш charts у каждого процесса свой, поэтому графики объединяются только внутри процесса
+chart_flight = SingleFlight()
+
+
+def chart_key(countries: list[str], start_date: datetime.date, end_date: datetime.date,
+              version: str | None = None) -> str:
+    '''
+    Takes: список стран, даты начала и конца интервала,
+    версия versions.chart_version (по умолчанию текущая)
+
+    Returns: ключ графика, не зависящий от порядка и повторов стран
+    '''
+    if version is None:
+        version = versions.chart_version()
+    normalized = '\n'.join([*sorted(set(countries)), start_date.isoformat(),
+                            end_date.isoformat(), str(version)])
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def get_chart(countries: list[str], start_date: datetime.date,
+              end_date: datetime.date, key: str | None = None) -> tuple[str, bytes]:
+    '''
+    Takes: список стран, даты начала и конца интервала, ключ графика
+    (по умолчанию chart_key по текущей версии versions.chart_version)
+
+    Returns: ключ графика и png
+
+    Отдает график из кэша charts, при промахе строит его по курсам из БД
+    в пуле процессов rendering и кэширует. Размер кэша и время жизни графиков
+    задаются в настройке CACHES['charts']. Одновременные промахи по одному графику
+    ждут одно построение
+    '''
+    if key is None:
+        key = chart_key(countries, start_date, end_date)
+    image = caches['charts'].get(key)
+    if image is None:
+        image = chart_flight.do(key, lambda: build_chart(key, countries, start_date, end_date))
+    return key, image
+
+
+def build_chart(key: str, countries: list[str], start_date: datetime.date,
+                end_date: datetime.date) -> bytes:
+    '''
+    Takes: ключ графика, список стран, даты начала и конца интервала
+
+    Returns: png, построенный по курсам из БД и сохраненный в кэш charts
+    '''
+    changes = services.get_relative_changes(sorted(set(countries)), start_date, end_date,
+                                            CHART_MAX_POINTS)
+    with metrics.span('render'):
+        image = rendering.get_renderer().render(changes)
+    caches['charts'].set(key, image)
+    return image
+
+
+async def get_chart_async(countries: list[str], start_date: datetime.date,
+                          end_date: datetime.date, key: str | None = None) -> tuple[str, bytes]:
+    '''
+    Асинхронная версия get_chart: данные читаются в потоке ORM,
+    график строится в пуле процессов, не блокируя event loop
+    '''
+    if key is None:
+        key = await sync_to_async(chart_key)(countries, start_date, end_date)
+    image = await caches['charts'].aget(key)
+    if image is None:
+        image = await chart_flight.do_async(key, lambda: build_chart_async(key, countries, start_date, end_date))
+    return key, image
+
+
+async def build_chart_async(key: str, countries: list[str], start_date: datetime.date,
+                            end_date: datetime.date) -> bytes:
+    '''
+    Асинхронная версия build_chart
+    '''
+    changes = await sync_to_async(services.get_relative_changes)(
+        sorted(set(countries)), start_date, end_date, CHART_MAX_POINTS)
+    with metrics.span('render'):
+        image = await rendering.get_renderer().render_async(changes)
+    await caches['charts'].aset(key, image)
+    return image
+
+
+def chart_max_age() -> int:
+    '''
+    Returns: время в секундах, которое браузер может хранить график
+    '''
+    return settings.CACHES['charts'].get('TIMEOUT', 300)
+
+
+def response_max_age(query, version: int | str) -> int:
+    '''
+    Takes: GET параметры запроса, текущая версия данных, от которых зависит ответ
+    (versions.data_version или versions.chart_version)
+
+    Returns: время в секундах, которое браузер может хранить ответ: chart_max_age,
+    если в url есть текущая версия данных v (url меняется вместе с данными), иначе 0,
+    чтобы браузер не показывал устаревший ответ после синхронизации
+    '''
+    return chart_max_age() if query.get('v') == str(version) else 0
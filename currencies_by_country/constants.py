@@ -0,0 +1,28 @@
+from django.conf import settings
+
+# ISO-код валюты -> название валюты на finmarket.ru
+TRANS_CODES = {
+    'EUR': 'ЕВРО',
+    'USD': 'Доллар США',
+    'JPY': 'Японская йена',
+    'GBP': 'Фунт стерлингов',
+    'CNY': 'Китайский юань Жэньминьби',
+    'TRY': 'Турецкая лира',
+    'INR': 'Индийская рупия',
+}
+
+# Максимальное число точек ряда в JSON API графика по умолчанию
+DEFAULT_MAX_POINTS = 500
+
+# Максимальное число точек ряда на png графике, длинные интервалы строятся по агрегатам
+CHART_MAX_POINTS = 200
+
+
+def tracked_currencies() -> dict[str, str]:
+    '''
+    Returns: словарь ISO-код -> название на finmarket.ru для отслеживаемых валют
+
+    По умолчанию TRANS_CODES, список можно расширить любой валютой с finmarket.ru
+    через настройку TRACKED_CURRENCIES
+    '''
+    return getattr(settings, 'TRACKED_CURRENCIES', TRANS_CODES)
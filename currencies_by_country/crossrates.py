@@ -0,0 +1,123 @@
+import datetime
+
+from django.core.cache import caches
+import numpy as np
+import pandas as pd
+
+from .constants import tracked_currencies
+from .models import CurrencyRates
+from .versions import data_version
+
+# Базовая валюта, к которой хранятся все курсы в CurrencyRates
+BASE_CURRENCY = 'RUB'
+
+# Длина блока дат в днях: матрицы кэшируются поблочно, блоки выровнены от 0001-01-01,
+# поэтому пересекающиеся интервалы используют одни и те же блоки
+BLOCK_DAYS = 64
+
+CROSS_RATES_TIMEOUT = 60 * 60
+
+
+def currency_axis() -> list[str]:
+    '''
+    Returns: ось валют матрицы: базовая валюта и отслеживаемые валюты по алфавиту
+    '''
+    return [BASE_CURRENCY, *sorted(tracked_currencies())]
+
+
+def blocks(start_date: datetime.date, end_date: datetime.date) -> list[datetime.date]:
+    '''
+    Takes: даты начала и конца интервала
+
+    Returns: даты начала блоков BLOCK_DAYS, пересекающих интервал
+    '''
+    first = (start_date.toordinal() - 1) // BLOCK_DAYS
+    last = (end_date.toordinal() - 1) // BLOCK_DAYS
+    return [datetime.date.fromordinal(block * BLOCK_DAYS + 1) for block in range(first, last + 1)]
+
+
+def cross_matrix(base_rates: np.ndarray) -> np.ndarray:
+    '''
+    Takes: массив (дата, валюта) курсов валют к базовой валюте
+
+    Returns: массив (дата, X, Y), где [d, x, y] - сколько единиц валюты X стоит одна
+    единица валюты Y на дату d. Считается одним делением с broadcasting
+    '''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return base_rates[:, np.newaxis, :] / base_rates[:, :, np.newaxis]
+
+
+def load_block(block_start: datetime.date, currencies: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Takes: дата начала блока, ось валют
+
+    Returns: даты блока с курсами (datetime64[D]) и матрица cross_matrix по ним.
+    Курсы блока читаются одним запросом, дни без курса валюты дают NaN
+    '''
+    block_end = block_start + datetime.timedelta(days=BLOCK_DAYS - 1)
+    rows = list(
+        CurrencyRates.objects.filter(date__range=(block_start, block_end),
+                                     currency_code__in=currencies[1:])
+        .values_list('date', 'currency_code', 'rate')
+    )
+    dates, date_index = np.unique(np.array([date for date, _, _ in rows], dtype='datetime64[D]'),
+                                  return_inverse=True)
+    position = {code: i for i, code in enumerate(currencies)}
+    currency_index = np.array([position[code] for _, code, _ in rows], dtype=np.intp)
+
+    base_rates = np.full((len(dates), len(currencies)), np.nan)
+    base_rates[:, 0] = 1.0
+    base_rates[date_index, currency_index] = np.array([rate for _, _, rate in rows], dtype=np.float64)
+    return dates, cross_matrix(base_rates)
+
+
+def get_block(block_start: datetime.date, currencies: list[str],
+              version: int) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Takes: дата начала блока, ось валют, версия данных о курсах
+
+    Returns: даты и матрица блока в формате load_block
+
+    Блок кэшируется по версии данных о курсах, общей для всех процессов, поэтому
+    после синхронизации новых курсов в любом процессе он перечитывается из БД
+    '''
+    key = f'crossrates:{version}:{block_start.isoformat()}:{",".join(currencies)}'
+    cache = caches['default']
+    block = cache.get(key)
+    if block is None:
+        block = load_block(block_start, currencies)
+        cache.set(key, block, timeout=CROSS_RATES_TIMEOUT)
+    return block
+
+
+def get_cross_matrix(start_date: datetime.date, end_date: datetime.date
+                     ) -> tuple[np.ndarray, list[str], np.ndarray]:
+    '''
+    Takes: даты начала и конца интервала
+
+    Returns: даты интервала с курсами, ось валют и матрица (дата, X, Y) в формате cross_matrix
+    '''
+    currencies = currency_axis()
+    version = data_version()
+    parts = [get_block(block_start, currencies, version) for block_start in blocks(start_date, end_date)]
+    dates = np.concatenate([dates for dates, _ in parts])
+    matrix = np.concatenate([matrix for _, matrix in parts])
+    in_range = (dates >= np.datetime64(start_date)) & (dates <= np.datetime64(end_date))
+    return dates[in_range], currencies, matrix[in_range]
+
+
+def get_cross_rates(currency: str, per: str, start_date: datetime.date,
+                    end_date: datetime.date) -> pd.DataFrame:
+    '''
+    Takes: валюта X, валюта Y (ISO-коды из currency_axis), даты начала и конца интервала
+
+    Returns: DataFrame с индексом Дата и колонками rate (сколько X стоит одна единица Y)
+    и change (относительное изменение курса от первого известного курса интервала, %)
+    '''
+    dates, currencies, matrix = get_cross_matrix(start_date, end_date)
+    rates = matrix[:, currencies.index(currency), currencies.index(per)]
+    known = rates[~np.isnan(rates)]
+    base = known[0] if len(known) else np.nan
+    changes = (rates / base - 1) * 100
+    return pd.DataFrame({'rate': rates, 'change': changes},
+                        index=pd.Index(dates.astype(object), name='Дата'))
@@ -0,0 +1,208 @@
+import csv
+import datetime
+import json
+import math
+from itertools import islice
+from typing import Iterable, Iterator
+
+from django.db.models import QuerySet
+
+from .models import CurrencyRates
+
+# Сколько строк читается из БД и записывается в одну группу строк Parquet за раз
+CHUNK_SIZE = 2000
+
+# Таблица выгрузки -> колонки: курсы из CurrencyRates и относительные изменения курсов,
+# которые считаются на лету (в БД не хранятся)
+EXPORT_TABLES = {
+    'rates': ['currency_code', 'date', 'rate'],
+    'changes': ['currency', 'date', 'relative_change'],
+}
+
+# Формат выгрузки -> тип содержимого
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+class ExportUnavailable(Exception):
+    '''
+    Формат выгрузки недоступен: не установлена необязательная зависимость
+    '''
+
+
+def export_rows(table: str, start_date: datetime.date | None = None,
+                end_date: datetime.date | None = None,
+                currency_codes: list[str] | None = None) -> tuple[list[str], Iterator[tuple]]:
+    '''
+    Takes: таблица из EXPORT_TABLES, необязательные даты начала и конца интервала и ISO-коды валют
+
+    Returns: названия колонок и итератор строк, отсортированных по валюте и дате
+
+    Строки читаются из БД частями по CHUNK_SIZE через QuerySet.iterator,
+    поэтому память не зависит от размера выгрузки
+    '''
+    columns = EXPORT_TABLES[table]
+    if table == 'changes':
+        return columns, change_rows(start_date, end_date, currency_codes)
+
+    queryset = rates_queryset(start_date, end_date)
+    if currency_codes:
+        queryset = queryset.filter(currency_code__in=currency_codes)
+    rows = queryset.order_by('currency_code', 'date').values_list(*columns).iterator(chunk_size=CHUNK_SIZE)
+    return columns, rows
+
+
+def rates_queryset(start_date: datetime.date | None, end_date: datetime.date | None) -> QuerySet:
+    '''
+    Takes: необязательные даты начала и конца интервала
+
+    Returns: QuerySet курсов CurrencyRates за интервал
+    '''
+    queryset: QuerySet = CurrencyRates.objects.all()
+    if start_date is not None:
+        queryset = queryset.filter(date__gte=start_date)
+    if end_date is not None:
+        queryset = queryset.filter(date__lte=end_date)
+    return queryset
+
+
+def change_rows(start_date: datetime.date | None, end_date: datetime.date | None,
+                currency_codes: list[str] | None) -> Iterator[tuple]:
+    '''
+    Takes: необязательные даты начала и конца интервала и ISO-коды валют
+
+    Returns: итератор строк (валюта, дата, относительное изменение курса в %)
+
+    Изменения считаются так же, как services.get_changes_since: от курса на начало интервала
+    (или последнего курса не раньше BASE_RATE_LOOKBACK до него), без интервала - от первого
+    курса валюты. Валюты без базового курса пропускаются. Курсы каждой валюты читаются
+    частями по CHUNK_SIZE
+    '''
+    from .services import BASE_RATE_LOOKBACK
+
+    if not currency_codes:
+        currency_codes = CurrencyRates.objects.order_by('currency_code').values_list(
+            'currency_code', flat=True).distinct()
+
+    for code in currency_codes:
+        rates = CurrencyRates.objects.filter(currency_code=code)
+        if start_date is None:
+            base = rates.order_by('date').values_list('rate', flat=True).first()
+        else:
+            base = rates.filter(date__range=(start_date - BASE_RATE_LOOKBACK, start_date)).order_by(
+                '-date').values_list('rate', flat=True).first()
+        if base is None:
+            continue
+
+        log_base = math.log(base)
+        rows = rates_queryset(start_date, end_date).filter(currency_code=code).order_by('date')
+        for date, rate in rows.values_list('date', 'rate').iterator(chunk_size=CHUNK_SIZE):
+            yield code, date, math.expm1(math.log(rate) - log_base) * 100
+
+
+class Echo:
+    '''
+    Файл, который возвращает записанную строку вместо ее хранения, для csv.writer
+    '''
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def csv_stream(columns: list[str], rows: Iterable[tuple]) -> Iterator[str]:
+    '''
+    Takes: названия колонок и строки
+
+    Returns: итератор строк CSV с заголовком
+    '''
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_stream(columns: list[str], rows: Iterable[tuple]) -> Iterator[str]:
+    '''
+    Takes: названия колонок и строки
+
+    Returns: итератор строк NDJSON, по одному объекту на строку таблицы
+    '''
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), default=datetime.date.isoformat, ensure_ascii=False) + '\n'
+
+
+class ChunkSink:
+    '''
+    Файл для ParquetWriter, который накапливает записанные байты до выдачи клиенту
+    '''
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def parquet_stream(columns: list[str], rows: Iterable[tuple]) -> Iterator[bytes]:
+    '''
+    Takes: названия колонок и строки
+
+    Returns: итератор частей файла Parquet, каждые CHUNK_SIZE строк - отдельная группа строк.
+    Требует необязательную зависимость pyarrow, без нее вызывает ExportUnavailable
+    '''
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportUnavailable('Parquet export requires pyarrow')
+
+    types = {'date': pa.date32(), 'currency_code': pa.string(), 'currency': pa.string()}
+    schema = pa.schema([(column, types.get(column, pa.float64())) for column in columns])
+
+    def generate() -> Iterator[bytes]:
+        sink = ChunkSink()
+        iterator = iter(rows)
+        with pq.ParquetWriter(sink, schema) as writer:
+            while chunk := list(islice(iterator, CHUNK_SIZE)):
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(zip(*chunk), schema)],
+                    schema=schema,
+                ))
+                yield sink.drain()
+        yield sink.drain()
+
+    return generate()
+
+
+def export_stream(fmt: str, columns: list[str], rows: Iterable[tuple]) -> Iterator:
+    '''
+    Takes: формат из EXPORT_FORMATS, названия колонок и строки
+
+    Returns: итератор частей выгрузки для StreamingHttpResponse
+    '''
+    if fmt == 'csv':
+        return csv_stream(columns, rows)
+    if fmt == 'ndjson':
+        return ndjson_stream(columns, rows)
+    return parquet_stream(columns, rows)
@@ -0,0 +1,231 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Callable, Iterable, Mapping, TypeVar
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+from .constants import tracked_currencies
+from .httpcache import CachedResponse, HttpCache, get_http_cache
+
+T = TypeVar('T')
+
+# Верхняя граница одновременных запросов к одному хосту при любом числе отслеживаемых валют
+MAX_PAGE_CONCURRENCY = 16
+
+
+def page_concurrency() -> int:
+    '''
+    Returns: число одновременных запросов по умолчанию: по странице архива на каждую
+    отслеживаемую валюту (все они на одном хосте), но не больше MAX_PAGE_CONCURRENCY
+    '''
+    return max(1, min(len(tracked_currencies()), MAX_PAGE_CONCURRENCY))
+
+
+class Fetcher:
+    '''
+    Параллельно скачивает страницы через общий пул соединений.
+
+    Запросы выполняются в ограниченном пуле потоков, к одному хосту одновременно
+    идет не больше per_host_limit запросов (по умолчанию оба предела - page_concurrency,
+    поэтому страницы всех отслеживаемых валют скачиваются одной волной), ошибки соединения и ответы 429/5xx
+    повторяются с экспоненциальной задержкой. Разбор страниц выполняется
+    в тех же потоках пула, а не в потоке запроса пользователя.
+    С кэшем HttpCache запросы условные, а неизменяемые страницы не запрашиваются повторно
+    '''
+
+    def __init__(self, max_workers: int | None = None, per_host_limit: int | None = None,
+                 retries: int = 3, backoff_factor: float = 0.5, timeout: float = 30,
+                 cache: HttpCache | None = None):
+        max_workers = max_workers or page_concurrency()
+        self.timeout = timeout
+        self.per_host_limit = per_host_limit or page_concurrency()
+        self.cache = cache
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=('GET',),
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='fetcher')
+        self._host_locks = defaultdict(lambda: threading.BoundedSemaphore(self.per_host_limit))
+        self._host_locks_guard = threading.Lock()
+
+    def _host_lock(self, url: str) -> threading.BoundedSemaphore:
+        with self._host_locks_guard:
+            return self._host_locks[urlsplit(url).netloc]
+
+    def get(self, url: str, immutable: bool = False) -> bytes:
+        '''
+        Takes: url страницы, признак того, что страница больше не изменится
+
+        Returns: тело ответа, при ответе с ошибкой вызывает requests.HTTPError
+        '''
+        cached = self.cache.get(url) if self.cache is not None else None
+        if cached is not None and cached.immutable:
+            return cached.body
+
+        host = urlsplit(url).netloc
+        with self._host_lock(url):
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, timeout=self.timeout,
+                                            headers=HttpCache.conditional_headers(cached))
+            except requests.RequestException as e:
+                metrics.record_upstream(host, type(e).__name__, time.perf_counter() - started)
+                raise
+            metrics.record_upstream(host, response.status_code, time.perf_counter() - started)
+        if response.status_code == 304 and cached is not None:
+            return revalidated(self.cache, url, cached, immutable)
+        response.raise_for_status()
+        store(self.cache, url, response.content, response.headers, immutable)
+        return response.content
+
+    def map(self, parse: Callable[[bytes], T], urls: Iterable[str], immutable: bool = False) -> list[T]:
+        '''
+        Takes: функция разбора тела ответа, список url, признак неизменяемых страниц
+
+        Returns: результаты разбора в порядке url
+
+        Скачивает и разбирает страницы параллельно. Пока страниц одного хоста не больше
+        per_host_limit и max_workers, общее время ограничено самой медленной страницей,
+        иначе страницы идут несколькими волнами. Задачи выполняются в контексте
+        вызывающего потока, чтобы их время попадало в метрики его HTTP запроса
+        '''
+        futures = [self._executor.submit(copy_context().run, lambda url=url: parse(self.get(url, immutable)))
+                   for url in urls]
+        return [future.result() for future in futures]
+
+
+class AsyncFetcher:
+    '''
+    Асинхронный аналог Fetcher на неблокирующем клиенте httpx.
+
+    Используется как асинхронный контекстный менеджер: пул соединений общий для запросов
+    внутри async with и закрывается при выходе из него. К одному хосту
+    одновременно идет не больше per_host_limit запросов (по умолчанию page_concurrency), ошибки соединения
+    и ответы 429/5xx повторяются с экспоненциальной задержкой.
+    Разбор страниц и работа с кэшем HttpCache выполняются в потоках,
+    чтобы не блокировать event loop
+    '''
+
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(self, max_connections: int | None = None, per_host_limit: int | None = None,
+                 retries: int = 3, backoff_factor: float = 0.5, timeout: float = 30,
+                 cache: HttpCache | None = None):
+        max_connections = max_connections or page_concurrency()
+        self.per_host_limit = per_host_limit or page_concurrency()
+        self.cache = cache
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections),
+            timeout=timeout,
+        )
+        self._host_locks = defaultdict(lambda: asyncio.Semaphore(self.per_host_limit))
+
+    async def __aenter__(self) -> 'AsyncFetcher':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.client.aclose()
+
+    async def get(self, url: str, immutable: bool = False) -> bytes:
+        '''
+        Takes: url страницы, признак того, что страница больше не изменится
+
+        Returns: тело ответа, при ответе с ошибкой вызывает httpx.HTTPStatusError
+        '''
+        cached = await asyncio.to_thread(self.cache.get, url) if self.cache is not None else None
+        if cached is not None and cached.immutable:
+            return cached.body
+
+        headers = HttpCache.conditional_headers(cached)
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._host_locks[host]:
+                    started = time.perf_counter()
+                    response = await self.client.get(url, headers=headers)
+                    metrics.record_upstream(host, response.status_code, time.perf_counter() - started)
+                if response.status_code not in self.retry_statuses or attempt == self.retries:
+                    break
+            except httpx.TransportError as e:
+                metrics.record_upstream(host, type(e).__name__, time.perf_counter() - started)
+                if attempt == self.retries:
+                    raise
+            await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+        if response.status_code == 304 and cached is not None:
+            return await asyncio.to_thread(revalidated, self.cache, url, cached, immutable)
+        response.raise_for_status()
+        await asyncio.to_thread(store, self.cache, url, response.content, response.headers, immutable)
+        return response.content
+
+    async def map(self, parse: Callable[[bytes], T], urls: Iterable[str], immutable: bool = False) -> list[T]:
+        '''
+        Takes: функция разбора тела ответа, список url, признак неизменяемых страниц
+
+        Returns: результаты разбора в порядке url
+        '''
+        async def fetch_and_parse(url: str) -> T:
+            return await asyncio.to_thread(parse, await self.get(url, immutable))
+
+        return list(await asyncio.gather(*(fetch_and_parse(url) for url in urls)))
+
+
+def store(cache: HttpCache | None, url: str, body: bytes, headers: Mapping[str, str], immutable: bool):
+    '''
+    Сохраняет ответ в кэш, если страница неизменяемая или ее можно проверить условным запросом
+    '''
+    etag, last_modified = headers.get('ETag'), headers.get('Last-Modified')
+    if cache is not None and (immutable or etag or last_modified):
+        cache.set(url, CachedResponse(body, etag, last_modified, immutable))
+
+
+def revalidated(cache: HttpCache, url: str, cached: CachedResponse, immutable: bool) -> bytes:
+    '''
+    Returns: тело сохраненного ответа после ответа 304, при необходимости помечает его неизменяемым
+    '''
+    if immutable:
+        cache.set(url, cached._replace(immutable=True))
+    return cached.body
+
+
+_fetcher = None
+_fetcher_guard = threading.Lock()
+
+
+def get_fetcher() -> Fetcher:
+    '''
+    Returns: общий для процесса Fetcher, создается при первом обращении
+    '''
+    global _fetcher
+    with _fetcher_guard:
+        if _fetcher is None:
+            _fetcher = Fetcher(cache=get_http_cache())
+        return _fetcher
+
+
+def open_async_fetcher() -> AsyncFetcher:
+    '''
+    Returns: новый AsyncFetcher с общим кэшем HttpCache для использования в async with.
+    Клиент httpx привязан к event loop, а под WSGI каждый запрос к async/ представлению
+    выполняется в новом loop, поэтому клиент открывается на один вызов и закрывается после него
+    '''
+    return AsyncFetcher(cache=get_http_cache())
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import NamedTuple
+
+from django.conf import settings
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str | None = None
+    last_modified: str | None = None
+    immutable: bool = False
+
+
+class HttpCache:
+    '''
+    Дисковый кэш ответов сайтов.
+
+    Для каждого url хранится тело ответа и заголовки ETag и Last-Modified,
+    по которым следующий запрос делается условным. Ответы, помеченные immutable
+    (архивы за интервалы целиком в прошлом), отдаются без обращения к сайту
+    '''
+
+    def __init__(self, directory: str | os.PathLike):
+        self.directory = Path(directory)
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = self.directory / digest[:2] / digest
+        return base.with_suffix('.json'), base.with_suffix('.body')
+
+    def get(self, url: str) -> CachedResponse | None:
+        '''
+        Takes: url страницы
+
+        Returns: сохраненный ответ или None
+        '''
+        meta_path, body_path = self._paths(url)
+        try:
+            meta = json.loads(meta_path.read_text(encoding='utf-8'))
+            body = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != url or meta.get('size') != len(body):
+            return None
+        return CachedResponse(body, meta.get('etag'), meta.get('last_modified'), meta.get('immutable', False))
+
+    def set(self, url: str, response: CachedResponse):
+        '''
+        Takes: url страницы и ответ
+
+        Файлы записываются через временный файл и os.replace, поэтому
+        параллельные процессы не видят записанный наполовину ответ
+        '''
+        meta_path, body_path = self._paths(url)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {'url': url, 'size': len(response.body), 'etag': response.etag,
+                'last_modified': response.last_modified, 'immutable': response.immutable}
+        self._write(body_path, response.body)
+        self._write(meta_path, json.dumps(meta).encode('utf-8'))
+
+    @staticmethod
+    def _write(path: Path, data: bytes):
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @staticmethod
+    def conditional_headers(cached: CachedResponse | None) -> dict[str, str]:
+        '''
+        Takes: сохраненный ответ или None
+
+        Returns: заголовки условного запроса If-None-Match и If-Modified-Since
+        '''
+        headers = dict()
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+        return headers
+
+
+def get_http_cache() -> HttpCache | None:
+    '''
+    Returns: кэш в каталоге из настройки HTTP_CACHE_DIR или None, если кэш выключен
+    '''
+    directory = getattr(settings, 'HTTP_CACHE_DIR', None)
+    return HttpCache(directory) if directory else None
@@ -0,0 +1,78 @@
+import asyncio
+import datetime
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import SyncLock
+
+
+def acquire(name: str, ttl: datetime.timedelta) -> str | None:
+    '''
+    Takes: название блокировки, время, через которое она снимется сама
+
+    Returns: токен владельца, если блокировка захвачена, иначе None
+    '''
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            SyncLock.objects.filter(name=name, expires_at__lte=now).delete()
+            SyncLock.objects.create(name=name, token=token, expires_at=now + ttl)
+    except IntegrityError:
+        return None
+    return token
+
+
+def release(name: str, token: str):
+    '''
+    Takes: название блокировки и токен владельца
+
+    Снимает блокировку, только если она еще принадлежит владельцу токена
+    '''
+    SyncLock.objects.filter(name=name, token=token).delete()
+
+
+@contextmanager
+def db_lock(name: str, ttl: datetime.timedelta = datetime.timedelta(minutes=30),
+            timeout: float = 0, poll: float = 0.1) -> Iterator[bool]:
+    '''
+    Takes: название блокировки, время, через которое она снимется сама,
+    сколько секунд ждать блокировку, занятую другим владельцем, и интервал проверок
+
+    Returns: контекстный менеджер, отдающий True, если блокировка захвачена.
+    Работает между процессами через таблицу SyncLock
+    '''
+    token = acquire(name, ttl)
+    deadline = time.monotonic() + timeout
+    while token is None and time.monotonic() < deadline:
+        time.sleep(poll)
+        token = acquire(name, ttl)
+    try:
+        yield token is not None
+    finally:
+        if token is not None:
+            release(name, token)
+
+
+@asynccontextmanager
+async def adb_lock(name: str, ttl: datetime.timedelta = datetime.timedelta(minutes=30),
+                   timeout: float = 0, poll: float = 0.1) -> AsyncIterator[bool]:
+    '''
+    Асинхронная версия db_lock: ожидание блокировки не блокирует event loop
+    '''
+    token = await sync_to_async(acquire)(name, ttl)
+    deadline = time.monotonic() + timeout
+    while token is None and time.monotonic() < deadline:
+        await asyncio.sleep(poll)
+        token = await sync_to_async(acquire)(name, ttl)
+    try:
+        yield token is not None
+    finally:
+        if token is not None:
+            await sync_to_async(release)(name, token)
@@ -0,0 +1,64 @@
+import json
+import platform
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from currencies_by_country.benchmarks import pipeline
+
+BASELINE_PATH = Path(pipeline.__file__).resolve().parent / 'baseline.json'
+
+
+class Command(BaseCommand):
+    help = ('Замеряет скачивание со stub-сервера, разбор, сохранение курсов, расчет относительных '
+            'изменений, подготовку рядов и построение графика на интервалах 1m, 1y и 2y '
+            'во временной БД. Замедление относительно базовых замеров считается ошибкой')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', nargs='+', choices=list(pipeline.SCALES),
+                            default=list(pipeline.SCALES), help='Какие интервалы замерять')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Сколько раз повторять каждый замер (берется лучшее время)')
+        parser.add_argument('--output', help='Файл для результатов в JSON (по умолчанию stdout)')
+        parser.add_argument('--baseline', default=str(BASELINE_PATH),
+                            help='Файл базовых замеров для поиска регрессий')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='Допустимое замедление относительно базовых замеров (0.5 - на 50%%)')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Записать результаты как новые базовые замеры')
+
+    def handle(self, *args, **options):
+        results = pipeline.run(options['scales'], options['repeat'])
+
+        baseline_path = Path(options['baseline'])
+        baseline = dict()
+        if baseline_path.exists():
+            baseline = json.loads(baseline_path.read_text(encoding='utf-8'))['results']
+        regressions = pipeline.compare(results, baseline, options['tolerance'])
+
+        report = json.dumps({
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'repeat': options['repeat'],
+            'results': results,
+            'regressions': regressions,
+        }, indent=2, ensure_ascii=False)
+        if options['output']:
+            Path(options['output']).write_text(report, encoding='utf-8')
+        else:
+            self.stdout.write(report)
+
+        if options['update_baseline']:
+            merged = {**baseline, **{result['name']: result['seconds'] for result in results}}
+            baseline_path.write_text(json.dumps({'results': merged}, indent=2, sort_keys=True) + '\n',
+                                     encoding='utf-8')
+            self.stderr.write(f'Базовые замеры записаны в {baseline_path}')
+            return
+
+        for regression in regressions:
+            self.stderr.write(
+                f'Регрессия {regression["name"]}: {regression["seconds"] * 1000:.1f} мс, '
+                f'базовое {regression["baseline"] * 1000:.1f} мс ({regression["ratio"]:.2f}x)'
+            )
+        if regressions:
+            raise CommandError(f'Найдено регрессий: {len(regressions)}')
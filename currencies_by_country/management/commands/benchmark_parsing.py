@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from currencies_by_country.benchmarks import parsing
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает скорость разбора сохраненных страниц finmarket.ru и iban.ru '
+            'прежним путем через BeautifulSoup и модулем tables на lxml')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Сколько раз повторять каждый замер (берется лучшее время)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"страница":<16}{"строк":>7}{"bs4, мс":>11}{"lxml, мс":>11}{"ускорение":>11}')
+        for result in parsing.run(options['repeat']):
+            self.stdout.write(
+                f'{result["name"]:<16}{result["rows"]:>7}{result["bs4"] * 1000:>11.2f}'
+                f'{result["lxml"] * 1000:>11.2f}{result["speedup"]:>10.1f}x'
+            )
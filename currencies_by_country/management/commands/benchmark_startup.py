@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from currencies_by_country.benchmarks import startup
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время старта и память процесса, загружающего urls, в новом интерпретаторе: '
+            'с ленивым импортом представлений (lazy) и с прежним импортом pandas, '
+            'matplotlib и HTTP клиентов при старте (eager)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Сколько раз повторять каждый замер (берется лучшее время)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"сценарий":<10}{"старт, мс":>11}{"память, МБ":>12}  загружены')
+        for result in startup.run(options['repeat']):
+            rss = f'{result["rss_mb"]:.1f}' if result['rss_mb'] is not None else '-'
+            self.stdout.write(
+                f'{result["name"]:<10}{result["seconds"] * 1000:>11.1f}{rss:>12}'
+                f'  {", ".join(result["heavy"]) or "-"}'
+            )
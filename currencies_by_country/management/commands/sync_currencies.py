@@ -0,0 +1,82 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from currencies_by_country import ratestore, services
+from currencies_by_country.locks import db_lock
+
+
+class Command(BaseCommand):
+    help = (
+        'Синхронизирует коды валют стран с iban.ru и курсы валют с finmarket.ru. '
+        'Без --loop выполняется один раз (для cron), с --loop работает как планировщик'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recent-days', type=int, default=7,
+                            help='Сколько последних дней курсов скачивать заново')
+        parser.add_argument('--backfill-days', type=int, default=2 * 365,
+                            help='За сколько дней докачивать отсутствующие курсы')
+        parser.add_argument('--skip-countries', action='store_true',
+                            help='Не синхронизировать коды валют стран')
+        parser.add_argument('--loop', action='store_true',
+                            help='Повторять синхронизацию по расписанию')
+        parser.add_argument('--rates-interval', type=int, default=60 * 60,
+                            help='Период синхронизации курсов в секундах для --loop')
+        parser.add_argument('--countries-interval', type=int, default=24 * 60 * 60,
+                            help='Период синхронизации кодов валют стран в секундах для --loop')
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            if not options['skip_countries']:
+                self.sync_countries()
+            self.sync_rates(options['recent_days'], options['backfill_days'])
+            return
+
+        next_countries = 0 if not options['skip_countries'] else float('inf')
+        next_rates = 0
+        while True:
+            now = time.monotonic()
+            if now >= next_countries:
+                self.sync_countries()
+                next_countries = now + options['countries_interval']
+            if now >= next_rates:
+                self.sync_rates(options['recent_days'], options['backfill_days'])
+                next_rates = now + options['rates_interval']
+            time.sleep(max(0, min(next_countries, next_rates) - time.monotonic()))
+
+    def sync_countries(self):
+        with db_lock('sync_countries') as acquired:
+            if not acquired:
+                self.stdout.write('Коды валют стран уже синхронизируются, пропуск')
+                return
+            try:
+                result = services.sync_country_codes()
+            except Exception as e:
+                self.stderr.write(f'Ошибка [sync_countries] - {e}')
+                return
+        self.stdout.write(f'Коды валют стран: добавлено {result.inserted}, обновлено {result.updated}')
+
+    def sync_rates(self, recent_days: int, backfill_days: int):
+        today = datetime.date.today()
+        recent_start = today - datetime.timedelta(days=recent_days)
+        with db_lock('sync_rates') as acquired:
+            if not acquired:
+                self.stdout.write('Курсы валют уже синхронизируются, пропуск')
+                return
+            try:
+                gaps = services.sync_missing_rates(today - datetime.timedelta(days=backfill_days),
+                                                   recent_start - datetime.timedelta(days=1),
+                                                   rebuild_store=False)
+                result = services.sync_rates(recent_start, today, rebuild_store=False)
+                # Хранилище пересобирается один раз за запуск и только если курсы изменились
+                transaction.on_commit(ratestore.ensure_built)
+            except Exception as e:
+                self.stderr.write(f'Ошибка [sync_rates] - {e}')
+                return
+        self.stdout.write(
+            f'Курсы валют: докачано интервалов {len(gaps)}, '
+            f'за последние дни добавлено {result.inserted}, обновлено {result.updated}'
+        )
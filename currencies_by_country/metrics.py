@@ -0,0 +1,205 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+# Границы корзин гистограмм в секундах
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Границы корзин гистограммы числа SQL запросов на HTTP запрос
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    '''
+    Гистограмма Prometheus с метками: для каждого набора меток число наблюдений
+    по корзинам, их сумма и количество
+    '''
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...], buckets: tuple = BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = dict()
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            counts, total = self._series.get(label_values, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._series[label_values] = (counts, total + value)
+
+    def expose(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for label_values, counts, total in series:
+            labels = format_labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                bucket_labels = format_labels((*self.labels, 'le'), (*label_values, str(bound)))
+                yield f'{self.name}_bucket{bucket_labels} {cumulative}'
+            yield f'{self.name}_sum{labels} {total}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Counter:
+    '''
+    Счетчик Prometheus с метками
+    '''
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._series = dict()
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def expose(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_values, value in series:
+            yield f'{self.name}{format_labels(self.labels, label_values)} {value}'
+
+
+def format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    '''
+    Returns: метки в формате Prometheus {name="value",...} или пустая строка
+    '''
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+REQUEST_SECONDS = Histogram('currencies_request_seconds', 'Время обработки HTTP запроса',
+                            ('view', 'method', 'status'))
+REQUEST_QUERIES = Histogram('currencies_request_sql_queries', 'Число SQL запросов на HTTP запрос',
+                            ('view',), QUERY_BUCKETS)
+STAGE_SECONDS = Histogram('currencies_stage_seconds', 'Время этапов обработки', ('stage',))
+SQL_SECONDS = Histogram('currencies_sql_seconds', 'Время SQL запросов', ())
+UPSTREAM_SECONDS = Histogram('currencies_upstream_request_seconds', 'Время запросов к сайтам', ('host',))
+UPSTREAM_REQUESTS = Counter('currencies_upstream_requests_total', 'Запросы к сайтам', ('host', 'status'))
+
+REGISTRY = (REQUEST_SECONDS, REQUEST_QUERIES, STAGE_SECONDS, SQL_SECONDS, UPSTREAM_SECONDS, UPSTREAM_REQUESTS)
+
+
+class RequestTimings:
+    '''
+    Длительности этапов одного HTTP запроса для заголовка Server-Timing.
+    Этапы могут выполняться в разных потоках, поэтому изменения под блокировкой
+    '''
+
+    def __init__(self):
+        self.stages = dict()
+        self.queries = 0
+        self.upstream_requests = 0
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_query(self, seconds: float):
+        with self._lock:
+            self.queries += 1
+            self.stages['db'] = self.stages.get('db', 0.0) + seconds
+
+    def add_upstream(self, seconds: float):
+        with self._lock:
+            self.upstream_requests += 1
+            self.stages['upstream'] = self.stages.get('upstream', 0.0) + seconds
+
+    def server_timing(self, total: float) -> str:
+        '''
+        Takes: общее время запроса в секундах
+
+        Returns: значение заголовка Server-Timing
+        '''
+        descriptions = {'db': f'{self.queries} queries', 'upstream': f'{self.upstream_requests} requests'}
+        with self._lock:
+            stages = dict(self.stages)
+        metrics = [f'total;dur={total * 1000:.1f}']
+        for stage, seconds in stages.items():
+            description = descriptions.get(stage)
+            metric = f'{stage};dur={seconds * 1000:.1f}'
+            metrics.append(f'{metric};desc="{description}"' if description else metric)
+        return ', '.join(metrics)
+
+
+current_request: ContextVar[RequestTimings | None] = ContextVar('current_request', default=None)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    '''
+    Takes: название этапа
+
+    Замеряет время блока: добавляет его в гистограмму currencies_stage_seconds
+    и в Server-Timing текущего HTTP запроса, если он есть
+    '''
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage)
+        timings = current_request.get()
+        if timings is not None:
+            timings.add(stage, seconds)
+
+
+def record_upstream(host: str, status: int | str, seconds: float):
+    '''
+    Takes: хост сайта, статус ответа (или название ошибки) и время запроса
+    '''
+    UPSTREAM_REQUESTS.inc(host, str(status))
+    UPSTREAM_SECONDS.observe(seconds, host)
+    timings = current_request.get()
+    if timings is not None:
+        timings.add_upstream(seconds)
+
+
+def sql_execute_wrapper(execute, sql, params, many, context):
+    '''
+    Обертка выполнения SQL запросов (connection.execute_wrappers): считает запросы
+    и их время для текущего HTTP запроса
+    '''
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - started
+        SQL_SECONDS.observe(seconds)
+        timings = current_request.get()
+        if timings is not None:
+            timings.add_query(seconds)
+
+
+def install_sql_wrapper(sender, connection, **kwargs):
+    '''
+    Обработчик сигнала connection_created: добавляет sql_execute_wrapper
+    в каждое новое соединение с БД, в каком бы потоке оно ни было открыто
+    '''
+    # В начало списка, чтобы не мешать временным оберткам connection.execute_wrapper(),
+    # которые снимают последнюю обертку списка
+    if sql_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, sql_execute_wrapper)
+
+
+def expose() -> str:
+    '''
+    Returns: все метрики процесса в текстовом формате Prometheus
+    '''
+    return '\n'.join(line for metric in REGISTRY for line in metric.expose()) + '\n'
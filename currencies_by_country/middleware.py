@@ -0,0 +1,54 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import HttpRequest, HttpResponse
+
+from . import metrics
+
+
+class TimingMiddleware:
+    '''
+    Замеряет время обработки запроса, его этапы (metrics.span), SQL запросы
+    и запросы к сайтам. Итог добавляется в заголовок Server-Timing ответа
+    и в метрики процесса, которые отдает /metrics
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        return self.finish(request, response, timings, started)
+
+    async def __acall__(self, request: HttpRequest):
+        timings, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        return self.finish(request, response, timings, started)
+
+    def start(self):
+        timings = metrics.RequestTimings()
+        return timings, metrics.current_request.set(timings), time.perf_counter()
+
+    def finish(self, request: HttpRequest, response: HttpResponse,
+               timings: metrics.RequestTimings, started: float) -> HttpResponse:
+        total = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.route if match is not None else 'unmatched'
+
+        metrics.REQUEST_SECONDS.observe(total, view, request.method, str(response.status_code))
+        metrics.REQUEST_QUERIES.observe(timings.queries, view)
+        response.headers['Server-Timing'] = timings.server_timing(total)
+        return response
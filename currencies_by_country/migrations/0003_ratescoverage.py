@@ -0,0 +1,21 @@
+# Generated by Django 5.0.4 on 2026-10-18 15:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currencies_by_country', '0002_alter_currencyratechange_currency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatesCoverage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField(verbose_name='Начало интервала')),
+                ('end_date', models.DateField(verbose_name='Конец интервала')),
+            ],
+        ),
+    ]
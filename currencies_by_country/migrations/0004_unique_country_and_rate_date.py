@@ -0,0 +1,33 @@
+# Generated by Django 5.0.4 on 2026-10-18 15:41
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicates(apps, schema_editor):
+    """Оставляет по одной (последней) строке на страну и на дату перед созданием уникальных индексов"""
+    for model_name, field in (('CountryCodes', 'country'), ('CurrencyRates', 'date')):
+        model = apps.get_model('currencies_by_country', model_name)
+        keep_ids = model.objects.values(field).annotate(last_id=Max('id')).values('last_id')
+        model.objects.exclude(id__in=keep_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currencies_by_country', '0003_ratescoverage'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='countrycodes',
+            name='country',
+            field=models.CharField(max_length=255, unique=True, verbose_name='Страна'),
+        ),
+        migrations.AlterField(
+            model_name='currencyrates',
+            name='date',
+            field=models.DateField(unique=True, verbose_name='Дата'),
+        ),
+    ]
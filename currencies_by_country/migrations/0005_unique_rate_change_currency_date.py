@@ -0,0 +1,26 @@
+# Generated by Django 5.0.4 on 2026-10-18 15:42
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicates(apps, schema_editor):
+    """Оставляет по одной (последней) строке на пару валюта-дата перед созданием уникального индекса"""
+    CurrencyRateChange = apps.get_model('currencies_by_country', 'CurrencyRateChange')
+    keep_ids = CurrencyRateChange.objects.values('currency', 'date').annotate(last_id=Max('id')).values('last_id')
+    CurrencyRateChange.objects.exclude(id__in=keep_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currencies_by_country', '0004_unique_country_and_rate_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='currencyratechange',
+            constraint=models.UniqueConstraint(fields=('currency', 'date'), name='unique_rate_change_currency_date'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.4 on 2026-10-18 15:42
+
+from django.db import migrations, models
+from django.db.models import Value
+from django.db.models.functions import Replace
+
+RATE_FIELDS = ['usd_currency', 'eur_currency', 'gpb_currency', 'ikr_currency', 'cny_currency', 'try_currency', 'jpy_currency']
+
+
+def decimal_commas_to_points(apps, schema_editor):
+    """Заменяет десятичные запятые на точки, чтобы строки привелись к числам при смене типа колонок"""
+    CurrencyRates = apps.get_model('currencies_by_country', 'CurrencyRates')
+    CurrencyRates.objects.update(**{
+        field: Replace(Replace(field, Value(','), Value('.')), Value(' '), Value(''))
+        for field in RATE_FIELDS
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currencies_by_country', '0005_unique_rate_change_currency_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(decimal_commas_to_points, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='currencyrates',
+            name='cny_currency',
+            field=models.FloatField(verbose_name='Китайский юань Жэньминьби'),
+        ),
+        migrations.AlterField(
+            model_name='currencyrates',
+            name='eur_currency',
+            field=models.FloatField(verbose_name='Евро'),
+        ),
+        migrations.AlterField(
+            model_name='currencyrates',
+            name='gpb_currency',
+            field=models.FloatField(verbose_name='Фунт стерлингов'),
+        ),
+        migrations.AlterField(
+            model_name='currencyrates',
+            name='ikr_currency',
+            field=models.FloatField(verbose_name='Индийская рупия'),
+        ),
+        migrations.AlterField(
+            model_name='currencyrates',
+            name='jpy_currency',
+            field=models.FloatField(verbose_name='Японская йена'),
+        ),
+        migrations.AlterField(
+            model_name='currencyrates',
+            name='try_currency',
+            field=models.FloatField(verbose_name='Турецкая лира'),
+        ),
+        migrations.AlterField(
+            model_name='currencyrates',
+            name='usd_currency',
+            field=models.FloatField(verbose_name='Доллар США'),
+        ),
+    ]
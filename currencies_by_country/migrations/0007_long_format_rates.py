@@ -0,0 +1,89 @@
+# Перевод CurrencyRates из широкого формата (колонка на валюту) в длинный (currency_code, date, rate)
+
+from django.db import migrations, models
+
+WIDE_FIELDS = {
+    'usd_currency': 'USD',
+    'eur_currency': 'EUR',
+    'gpb_currency': 'GBP',
+    'ikr_currency': 'INR',
+    'cny_currency': 'CNY',
+    'try_currency': 'TRY',
+    'jpy_currency': 'JPY',
+}
+
+
+def wide_to_long(apps, schema_editor):
+    """Разворачивает строки курсов по валютам, переименовывает валюты изменений и покрытия в ISO-коды"""
+    CurrencyRates = apps.get_model('currencies_by_country', 'CurrencyRates')
+    CurrencyRatesLong = apps.get_model('currencies_by_country', 'CurrencyRatesLong')
+    CurrencyRateChange = apps.get_model('currencies_by_country', 'CurrencyRateChange')
+    RatesCoverage = apps.get_model('currencies_by_country', 'RatesCoverage')
+
+    CurrencyRatesLong.objects.bulk_create(
+        (
+            CurrencyRatesLong(currency_code=code, date=row['date'], rate=row[field])
+            for row in CurrencyRates.objects.values('date', *WIDE_FIELDS).iterator()
+            for field, code in WIDE_FIELDS.items()
+        ),
+        batch_size=1000,
+    )
+
+    for field, code in WIDE_FIELDS.items():
+        CurrencyRateChange.objects.filter(currency=field).update(currency=code)
+
+    coverage = list(RatesCoverage.objects.filter(currency_code=''))
+    RatesCoverage.objects.bulk_create(
+        RatesCoverage(currency_code=code, start_date=interval.start_date, end_date=interval.end_date)
+        for interval in coverage
+        for code in WIDE_FIELDS.values()
+    )
+    RatesCoverage.objects.filter(currency_code='').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currencies_by_country', '0006_numeric_rates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurrencyRatesLong',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency_code', models.CharField(max_length=16, verbose_name='Код валюты')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('rate', models.FloatField(verbose_name='Курс к рублю')),
+            ],
+            options={
+                'constraints': [
+                    models.UniqueConstraint(fields=('currency_code', 'date'), name='unique_rate_currency_date'),
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name='ratescoverage',
+            name='currency_code',
+            field=models.CharField(default='', max_length=16, verbose_name='Код валюты'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='countrycodes',
+            name='code',
+            field=models.CharField(db_index=True, max_length=255, verbose_name='Код'),
+        ),
+        migrations.AlterField(
+            model_name='currencyratechange',
+            name='currency',
+            field=models.CharField(max_length=255, verbose_name='Код валюты'),
+        ),
+        migrations.RunPython(wide_to_long, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='CurrencyRates',
+        ),
+        migrations.RenameModel(
+            old_name='CurrencyRatesLong',
+            new_name='CurrencyRates',
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.4 on 2026-10-18 15:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currencies_by_country', '0007_long_format_rates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Название')),
+                ('token', models.CharField(max_length=32, verbose_name='Владелец')),
+                ('expires_at', models.DateTimeField(verbose_name='Истекает')),
+            ],
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.0.4 on 2026-10-18 15:58
+
+from django.db import migrations, models
+
+
+# Копия агрегации из rollups.py на момент миграции: миграции не должны зависеть
+# от кода приложения, который может измениться позже
+ROLLUP_PERIODS = {
+    'week': 'W-SUN',
+    'month': 'M',
+}
+
+
+def build_rollups(apps, schema_editor):
+    """Строит недельные и месячные агрегаты по уже скачанным курсам"""
+    import pandas as pd
+
+    CurrencyRates = apps.get_model('currencies_by_country', 'CurrencyRates')
+    RateRollup = apps.get_model('currencies_by_country', 'RateRollup')
+
+    rates = pd.DataFrame(list(CurrencyRates.objects.values_list('currency_code', 'date', 'rate')),
+                         columns=['currency_code', 'date', 'rate'])
+    if rates.empty:
+        return
+    rates = rates.sort_values(['currency_code', 'date'])
+    for period, freq in ROLLUP_PERIODS.items():
+        starts = pd.to_datetime(rates['date']).dt.to_period(freq).dt.start_time.dt.date
+        rollups = (
+            rates.assign(period_start=starts.to_numpy())
+            .groupby(['currency_code', 'period_start'], sort=True)
+            .agg(first_date=('date', 'first'), last_date=('date', 'last'),
+                 open=('rate', 'first'), close=('rate', 'last'),
+                 low=('rate', 'min'), high=('rate', 'max'),
+                 mean=('rate', 'mean'), days=('rate', 'size'))
+            .reset_index()
+        )
+        RateRollup.objects.bulk_create(
+            (RateRollup(period=period, **row) for row in rollups.to_dict(orient='records')),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currencies_by_country', '0008_synclock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency_code', models.CharField(max_length=16, verbose_name='Код валюты')),
+                ('period', models.CharField(choices=[('week', 'Неделя'), ('month', 'Месяц')], max_length=8, verbose_name='Период')),
+                ('period_start', models.DateField(verbose_name='Начало периода')),
+                ('first_date', models.DateField(verbose_name='Первый день с курсом')),
+                ('last_date', models.DateField(verbose_name='Последний день с курсом')),
+                ('open', models.FloatField(verbose_name='Курс открытия')),
+                ('close', models.FloatField(verbose_name='Курс закрытия')),
+                ('low', models.FloatField(verbose_name='Минимум')),
+                ('high', models.FloatField(verbose_name='Максимум')),
+                ('mean', models.FloatField(verbose_name='Среднее')),
+                ('days', models.PositiveIntegerField(verbose_name='Дней с курсом')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='raterollup',
+            constraint=models.UniqueConstraint(fields=('currency_code', 'period', 'period_start'), name='unique_rollup_currency_period_start'),
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Курсы теперь хранятся за одну единицу валюты (курс finmarket.ru делится на Кол-во).
+# Прежние курсы валют, котируемых за 10, 100 и больше единиц, записаны без деления,
+# а Кол-во в БД не сохранялось, поэтому нельзя узнать, какие строки нужно разделить.
+# Все курсы, их агрегаты и покрытие удаляются: sync_currencies и get_rates заново
+# скачивают любой запрошенный интервал, и старые значения нигде не смешиваются с новыми
+
+import time
+
+from django.db import migrations
+
+
+def reset_rates(apps, schema_editor):
+    """Удаляет курсы, агрегаты и покрытие, записанные до деления на Кол-во"""
+    db = schema_editor.connection.alias
+    for model in ('CurrencyRates', 'RateRollup', 'RatesCoverage'):
+        apps.get_model('currencies_by_country', model).objects.using(db).all().delete()
+
+    # Кэши графиков, кросс-курсов и хранилище ratestore собраны по старым курсам
+    DataVersion = apps.get_model('currencies_by_country', 'DataVersion')
+    DataVersion.objects.using(db).bulk_create(
+        [DataVersion(name='rates_version', version=time.time_ns())],
+        update_conflicts=True, unique_fields=['name'], update_fields=['version'],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currencies_by_country', '0010_dataversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_rates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.0.4 on 2026-10-18 16:43
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currencies_by_country', '0011_rescrape_rates_per_unit'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='CurrencyRateChange',
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.4 on 2026-10-18 16:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currencies_by_country', '0012_delete_currencyratechange'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='currencyrates',
+            index=models.Index(fields=['date'], name='rate_date_idx'),
+        ),
+    ]
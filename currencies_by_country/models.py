@@ -1,11 +1,13 @@
 from django.db import models
 import datetime
 
+from .upsert import UpsertResult, bulk_upsert
+
 class CountryCodes(models.Model):
 
-    country = models.CharField(max_length=255, null=False, verbose_name='Страна')
+    country = models.CharField(max_length=255, null=False, unique=True, verbose_name='Страна')
     currency = models.CharField(max_length=255, null=False, verbose_name='Валюта')
-    code = models.CharField(max_length=255, null=False, verbose_name='Код')
+    code = models.CharField(max_length=255, null=False, db_index=True, verbose_name='Код')
     number = models.CharField(max_length=255, null=False, verbose_name='Номер')
 
     def __str__(self):
@@ -13,57 +15,116 @@ class CountryCodes(models.Model):
     
 class CurrencyRates(models.Model):
 
-    usd_currency = models.CharField(max_length=255, verbose_name='Доллар США')
-    eur_currency = models.CharField(max_length=255, verbose_name='Евро')
-    gpb_currency = models.CharField(max_length=255, verbose_name='Фунт стерлингов')
-    ikr_currency = models.CharField(max_length=255, verbose_name='Индийская рупия')
-    cny_currency = models.CharField(max_length=255, verbose_name='Китайский юань Жэньминьби')
-    try_currency = models.CharField(max_length=255, verbose_name='Турецкая лира')
-    jpy_currency = models.CharField(max_length=255, verbose_name='Японская йена')
+    currency_code = models.CharField(max_length=16, verbose_name='Код валюты')
     date = models.DateField(verbose_name='Дата')
+    rate = models.FloatField(verbose_name='Курс к рублю')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['currency_code', 'date'], name='unique_rate_currency_date'),
+        ]
+        # Выборки интервала по всем валютам (выгрузки, изменения от даты) фильтруют только по дате
+        indexes = [
+            models.Index(fields=['date'], name='rate_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.currency_code} - {self.date}'
+
+class RateRollup(models.Model):
+    '''
+    Недельные и месячные агрегаты курсов валюты. Для длинных интервалов
+    графики и API читают их вместо дневных курсов
+    '''
+    PERIOD_CHOICES = [('week', 'Неделя'), ('month', 'Месяц')]
+
+    currency_code = models.CharField(max_length=16, verbose_name='Код валюты')
+    period = models.CharField(max_length=8, choices=PERIOD_CHOICES, verbose_name='Период')
+    period_start = models.DateField(verbose_name='Начало периода')
+    first_date = models.DateField(verbose_name='Первый день с курсом')
+    last_date = models.DateField(verbose_name='Последний день с курсом')
+    open = models.FloatField(verbose_name='Курс открытия')
+    close = models.FloatField(verbose_name='Курс закрытия')
+    low = models.FloatField(verbose_name='Минимум')
+    high = models.FloatField(verbose_name='Максимум')
+    mean = models.FloatField(verbose_name='Среднее')
+    days = models.PositiveIntegerField(verbose_name='Дней с курсом')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['currency_code', 'period', 'period_start'],
+                                    name='unique_rollup_currency_period_start'),
+        ]
 
     @classmethod
-    def calculate_relative_changes(self, base_date: datetime.date):
+    def refresh(self, currency_codes: list[str], start_date: datetime.date,
+                end_date: datetime.date) -> UpsertResult:
         '''
-        Takes: Принимает базовую дату, с которой рассчитываются относительные изменения курсов
+        Takes: ISO-коды валют, даты начала и конца интервала с изменившимися курсами
 
-        Return: None
+        Returns: UpsertResult по всем уровням агрегации
 
-        Заносит все в таблицу CurrencyRateChange, при отсутствии изменений в строке не создает новую,
-        при наличии строки с датой и валютой, как на входе, проверяет, сменилось ли относительная величина,
-        и меняет ее если надо, при отсутвии создает такую строку
+        Пересчитывает агрегаты всех периодов, пересекающих интервал, по курсам
+        из CurrencyRates: курсы читаются одним запросом, агрегаты всех уровней
+        записываются одним bulk upsert. Периоды вне интервала не пересчитываются
         '''
-        base_rates = CurrencyRates.objects.filter(date=base_date).first()
-        if not base_rates:
-            return 
-        
-        currencies = ['usd_currency', 'eur_currency', 'gpb_currency', 'ikr_currency', 'cny_currency', 'try_currency', 'jpy_currency']
-        queryset = self.objects.all()
-        for row in queryset:
-            
-            for currency in currencies:
-                defaults = dict()
-                base_rate = float(getattr(base_rates, currency).replace(',', '.'))
-                current_rate = float(getattr(row, currency).replace(',', '.'))
-                relative_change = ((current_rate - base_rate) / base_rate) * 100
-                defaults['currency'] = currency
-                change_obj, created = CurrencyRateChange.objects.update_or_create(
-                    date=row.date,
-                    currency=currency,
-                    defaults={
-                        'relative_change': relative_change,
-                    },
-                )    
-                change_obj.save()
+        import pandas as pd
+
+        from . import rollups
+
+        rows = CurrencyRates.objects.filter(
+            currency_code__in=currency_codes,
+            date__range=(min(rollups.period_start(start_date, period) for period in rollups.PERIODS),
+                         max(rollups.period_end(end_date, period) for period in rollups.PERIODS)),
+        ).values_list('currency_code', 'date', 'rate')
+        rates = pd.DataFrame(list(rows), columns=['currency_code', 'date', 'rate'])
+
+        objs = []
+        for period in rollups.PERIODS:
+            # Берутся только периоды, пересекающие интервал, а не все прочитанные курсы
+            in_range = rates['date'].between(rollups.period_start(start_date, period),
+                                             rollups.period_end(end_date, period))
+            objs.extend(
+                self(period=period, **row)
+                for row in rollups.aggregate_periods(rates[in_range], period).to_dict(orient='records')
+            )
+        return bulk_upsert(self, objs, ['currency_code', 'period', 'period_start'],
+                           ['first_date', 'last_date', 'open', 'close', 'low', 'high', 'mean', 'days'])
 
     def __str__(self):
-        return str(self.pk)
+        return f'{self.currency_code} - {self.period} {self.period_start}'
 
-class CurrencyRateChange(models.Model):
-    currency = models.CharField(max_length=255, verbose_name='Валюта')
-    date = models.DateField(verbose_name='Дата')
-    relative_change = models.FloatField(verbose_name='Относительное изменение (%)')
+class RatesCoverage(models.Model):
+    '''
+    Интервал дат, за который курсы валюты уже скачаны с finmarket.ru.
+    Нужен, чтобы отличать дни без торгов (выходные, праздники) от еще не скачанных дней
+    '''
+    currency_code = models.CharField(max_length=16, verbose_name='Код валюты')
+    start_date = models.DateField(verbose_name='Начало интервала')
+    end_date = models.DateField(verbose_name='Конец интервала')
+
+    def __str__(self):
+        return f'{self.currency_code}: {self.start_date} - {self.end_date}'
+
+class SyncLock(models.Model):
+    '''
+    Блокировка фоновой синхронизации, общая для всех процессов.
+    Строка существует, пока блокировка захвачена, просроченные блокировки снимаются автоматически
+    '''
+    name = models.CharField(max_length=255, unique=True, verbose_name='Название')
+    token = models.CharField(max_length=32, verbose_name='Владелец')
+    expires_at = models.DateTimeField(verbose_name='Истекает')
+
+    def __str__(self):
+        return self.name
+
+class DataVersion(models.Model):
+    '''
+    Версия данных (курсов или списка стран), общая для всех процессов.
+    Меняется при каждом сохранении данных, кэши строятся с версией в ключе
+    '''
+    name = models.CharField(max_length=64, unique=True, verbose_name='Данные')
+    version = models.BigIntegerField(verbose_name='Версия')
 
     def __str__(self):
-        return f'{self.currency} - {self.date}'
-    
\ No newline at end of file
+        return f'{self.name}: {self.version}'
@@ -0,0 +1,209 @@
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+import numpy as np
+
+from . import versions
+from .models import CurrencyRates
+from .versions import data_version
+
+# Первые HEADER_SIZE байт файла - JSON заголовок, дополненный пробелами
+HEADER_SIZE = 4096
+STORE_FORMAT = 'currencies-rate-store-1'
+
+# Сколько секунд версия данных, с которой сверяется хранилище, читается из памяти,
+# а не из БД (настройка RATE_STORE_VERSION_TTL)
+DEFAULT_VERSION_TTL = 1.0
+
+
+class RateStore:
+    '''
+    Колоночное хранилище курсов в файле, отображенном в память (mmap).
+
+    Ось дат - отсортированный массив int32 порядковых номеров дней (date.toordinal),
+    курсы каждой валюты - отдельный непрерывный массив float64 той же длины,
+    дни без курса валюты - NaN. Файл открывается только на чтение, поэтому страницы
+    делятся между всеми процессами через page cache, а срезы по датам - это
+    двоичный поиск и представления массивов без копирования и SQL запросов.
+    version - версия данных о курсах, по которой собран файл
+    '''
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        with open(self.path, 'rb') as file:
+            header = json.loads(file.read(HEADER_SIZE))
+        if header.get('format') != STORE_FORMAT:
+            raise ValueError(f'{self.path} is not a rate store')
+        self.version: int | None = header.get('version')
+        self.currencies: list[str] = header['currencies']
+        size = header['days']
+        if size:
+            self.days = np.memmap(self.path, dtype=np.int32, mode='r', offset=HEADER_SIZE, shape=(size,))
+            self.columns = np.memmap(self.path, dtype=np.float64, mode='r', offset=columns_offset(size),
+                                     shape=(len(self.currencies), size))
+        else:
+            self.days = np.empty(0, dtype=np.int32)
+            self.columns = np.empty((len(self.currencies), 0), dtype=np.float64)
+        self._positions = {code: i for i, code in enumerate(self.currencies)}
+
+    def bounds(self, start_date: datetime.date, end_date: datetime.date) -> tuple[int, int]:
+        '''
+        Takes: даты начала и конца интервала
+
+        Returns: границы [left, right) дней интервала на оси дат, найденные двоичным поиском
+        '''
+        return (int(np.searchsorted(self.days, start_date.toordinal(), side='left')),
+                int(np.searchsorted(self.days, end_date.toordinal(), side='right')))
+
+    def series(self, currency_code: str, start_date: datetime.date,
+               end_date: datetime.date) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        Takes: ISO-код валюты, даты начала и конца интервала
+
+        Returns: представления оси дат и курсов валюты за интервал (без копирования)
+        '''
+        left, right = self.bounds(start_date, end_date)
+        return self.days[left:right], self.columns[self._positions[currency_code], left:right]
+
+
+def columns_offset(size: int) -> int:
+    '''
+    Returns: смещение колонок курсов в файле, выровненное на 8 байт
+    '''
+    return HEADER_SIZE + -(-size * 4 // 8) * 8
+
+
+def store_path() -> Path | None:
+    '''
+    Returns: путь к файлу хранилища в каталоге из настройки RATE_STORE_DIR
+    или None, если хранилище выключено. Имя файла зависит от БД, поэтому
+    хранилища разных БД (например, тестовой) не смешиваются
+    '''
+    directory = getattr(settings, 'RATE_STORE_DIR', None)
+    if not directory:
+        return None
+    database = str(connections['default'].settings_dict['NAME'])
+    return Path(directory) / f'rates-{hashlib.sha256(database.encode("utf-8")).hexdigest()[:16]}.bin'
+
+
+def rebuild() -> Path | None:
+    '''
+    Returns: путь к пересобранному файлу хранилища или None, если хранилище выключено
+
+    Читает все курсы CurrencyRates одним запросом и записывает файл через временный
+    файл и os.replace: процессы, уже открывшие прежний файл, дочитывают его,
+    а следующие обращения открывают новый. Версия данных читается до курсов,
+    поэтому файл никогда не помечается версией новее его данных
+    '''
+    path = store_path()
+    if path is None:
+        return None
+    version = data_version()
+    rows = list(CurrencyRates.objects.values_list('currency_code', 'date', 'rate'))
+    currencies = sorted({code for code, _, _ in rows})
+
+    days, day_index = np.unique(np.array([date.toordinal() for _, date, _ in rows], dtype=np.int32),
+                                return_inverse=True)
+    columns = np.full((len(currencies), len(days)), np.nan)
+    position = {code: i for i, code in enumerate(currencies)}
+    columns[np.array([position[code] for code, _, _ in rows], dtype=np.intp), day_index] = \
+        np.array([rate for _, _, rate in rows], dtype=np.float64)
+
+    header = json.dumps({'format': STORE_FORMAT, 'version': version, 'currencies': currencies,
+                         'days': len(days)}).encode('utf-8')
+    if len(header) > HEADER_SIZE:
+        raise ValueError(f'Rate store header is {len(header)} bytes, more than {HEADER_SIZE}')
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(header.ljust(HEADER_SIZE))
+            file.write(days.astype(np.int32).tobytes())
+            file.write(b'\0' * (columns_offset(len(days)) - HEADER_SIZE - days.nbytes))
+            file.write(columns.tobytes())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path
+
+
+def ensure_built() -> Path | None:
+    '''
+    Returns: путь к файлу хранилища, собирает его, если файла еще нет
+    или он собран по другой версии данных о курсах
+    '''
+    path = store_path()
+    if path is not None and open_store(path) is None:
+        rebuild()
+    return path
+
+
+_store = None
+_store_key = None
+_store_guard = threading.Lock()
+_version = None
+
+
+def current_version() -> int:
+    '''
+    Returns: версия данных о курсах, с которой сверяется хранилище
+
+    Версия читается из БД не чаще раза в RATE_STORE_VERSION_TTL секунд, поэтому
+    горячее чтение хранилища обходится без SQL. Изменения версий в этом процессе
+    сбрасывают запомненную версию сразу, изменения в других процессах становятся
+    видны не позже чем через RATE_STORE_VERSION_TTL секунд
+    '''
+    global _version
+    bumps, now = versions.local_bumps, time.monotonic()
+    ttl = getattr(settings, 'RATE_STORE_VERSION_TTL', DEFAULT_VERSION_TTL)
+    cached = _version
+    if cached is not None and cached[1] == bumps and now - cached[2] < ttl:
+        return cached[0]
+    version = data_version()
+    _version = (version, bumps, now)
+    return version
+
+
+def open_store(path: Path) -> RateStore | None:
+    '''
+    Takes: путь к файлу хранилища
+
+    Returns: хранилище или None, если файла нет или он собран по другой версии данных
+
+    Открытое хранилище переиспользуется, пока файл не заменен: проверка - один stat
+    '''
+    global _store, _store_key
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    key = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _store_guard:
+        if key != _store_key:
+            _store, _store_key = RateStore(path), key
+        store = _store
+    return store if store.version == current_version() else None
+
+
+def get_store() -> RateStore | None:
+    '''
+    Returns: хранилище текущего файла или None, если хранилище выключено, еще не собрано
+    или устарело
+
+    Хранилище сверяется с общей версией данных о курсах из DataVersion (current_version),
+    поэтому курсы, записанные в БД после сборки файла, не скрываются им дольше
+    RATE_STORE_VERSION_TTL секунд: пока файл не пересобран, курсы читаются из БД
+    '''
+    path = store_path()
+    if path is None:
+        return None
+    return open_store(path)
@@ -0,0 +1,209 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from io import BytesIO
+from typing import TYPE_CHECKING, Any, Callable
+
+from django.conf import settings
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class RenderUnavailable(Exception):
+    '''
+    График не удалось построить: очередь сервиса заполнена или истекло время ожидания
+    '''
+
+
+def render_chart(changes: 'pd.DataFrame') -> bytes:
+    '''
+    Takes: DataFrame относительных изменений из services.get_relative_changes
+
+    Returns: png с графиком относительных изменений курсов валют стран
+
+    Использует объектный API Figure без глобального состояния pyplot,
+    поэтому безопасна для вызова из нескольких потоков и процессов.
+    matplotlib импортируется при первом вызове: с пулом процессов
+    он загружается только в процессах пула, а не в процессах Django
+    '''
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.dates import DayLocator
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+
+    # Строим график для каждой страны
+    for country in changes.columns:
+        ax.plot(changes.index, changes[country], label=country)
+
+    # Добавляем подписи к осям и заголовок
+    ax.set_xlabel('Дата')
+    ax.set_ylabel('Относительное изменение курса (%)')
+    ax.set_title('Относительные изменения курсов валют')
+    ax.legend()
+
+    # Поворачиваем даты на оси x для лучшей читаемости
+    ax.tick_params(axis='x', labelrotation=90)
+    ax.xaxis.set_major_locator(DayLocator(interval=10))
+    ax.grid(visible=True)
+
+    # Сохраняем график
+    fig.tight_layout()
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+def warm_up() -> int:
+    '''
+    Инициализатор процессов пула: строит пустой график, чтобы matplotlib
+    был импортирован, а кэш шрифтов загружен до первого запроса
+
+    Returns: pid процесса
+    '''
+    import pandas as pd
+
+    render_chart(pd.DataFrame({'warm-up': [0.0, 1.0]}, index=pd.to_datetime(['2024-01-01', '2024-01-02'])))
+    return os.getpid()
+
+
+class ChartRenderer:
+    '''
+    Сервис построения графиков в пуле процессов, прогреваемых методом start.
+
+    Графики строятся параллельно на всех ядрах, не держа GIL процессов Django.
+    Одновременно в работе и в очереди не больше max_pending задач, лишние сразу
+    отклоняются с RenderUnavailable, как и задачи, не выполненные за timeout секунд.
+    При workers=0 графики строятся в вызывающем потоке (для разработки и тестов)
+    '''
+
+    def __init__(self, workers: int, max_pending: int, timeout: float):
+        self.workers = workers
+        self.timeout = timeout
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        if workers:
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=warm_up,
+            )
+
+    def start(self) -> set[int]:
+        '''
+        Запускает все процессы пула и ждет, пока каждый из них выполнит warm_up.
+        Пул сам запускает процессы по одному на задачу, поэтому без start первые
+        запросы ждут запуска процесса и импорта matplotlib
+
+        Returns: pid процессов пула (пустое множество при workers=0)
+        '''
+        pids = set()
+        # Прогретый процесс может забрать несколько задач, пока остальные еще
+        # запускаются, поэтому задачи отправляются, пока не ответят все процессы
+        while len(pids) < self.workers:
+            futures = [self._executor.submit(warm_up) for _ in range(self.workers)]
+            pids.update(future.result(timeout=self.timeout) for future in futures)
+        return pids
+
+    def submit(self, func: Callable[..., Any], *args) -> Future:
+        '''
+        Takes: функция и ее аргументы (должны передаваться между процессами)
+
+        Returns: Future с результатом функции, при заполненной очереди вызывает RenderUnavailable
+        '''
+        if not self._pending.acquire(blocking=False):
+            raise RenderUnavailable('Chart render queue is full')
+        try:
+            if self._executor is None:
+                future = Future()
+                try:
+                    future.set_result(func(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+            else:
+                future = self._executor.submit(func, *args)
+        except BaseException:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda _: self._pending.release())
+        return future
+
+    def run(self, func: Callable[..., Any], *args) -> Any:
+        '''
+        Takes: функция и ее аргументы
+
+        Returns: результат функции, при переполнении или таймауте вызывает RenderUnavailable
+        '''
+        future = self.submit(func, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise RenderUnavailable(f'Chart was not rendered in {self.timeout} seconds')
+
+    async def run_async(self, func: Callable[..., Any], *args) -> Any:
+        '''
+        Асинхронная версия run, не блокирует event loop
+        '''
+        future = asyncio.wrap_future(self.submit(func, *args))
+        try:
+            return await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise RenderUnavailable(f'Chart was not rendered in {self.timeout} seconds')
+
+    def render(self, changes: 'pd.DataFrame') -> bytes:
+        '''
+        Takes: DataFrame относительных изменений
+
+        Returns: png с графиком
+        '''
+        return self.run(render_chart, changes)
+
+    async def render_async(self, changes: 'pd.DataFrame') -> bytes:
+        '''
+        Асинхронная версия render
+        '''
+        return await self.run_async(render_chart, changes)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_renderers = dict()
+_renderers_guard = threading.Lock()
+
+
+def get_renderer() -> ChartRenderer:
+    '''
+    Returns: общий для процесса ChartRenderer с параметрами из настроек
+    CHART_RENDER_WORKERS, CHART_RENDER_MAX_PENDING и CHART_RENDER_TIMEOUT
+    '''
+    params = (
+        getattr(settings, 'CHART_RENDER_WORKERS', min(4, os.cpu_count() or 1)),
+        getattr(settings, 'CHART_RENDER_MAX_PENDING', 32),
+        getattr(settings, 'CHART_RENDER_TIMEOUT', 30),
+    )
+    with _renderers_guard:
+        if params not in _renderers:
+            _renderers[params] = ChartRenderer(*params)
+        return _renderers[params]
+
+
+def start_renderer() -> ChartRenderer | None:
+    '''
+    Returns: общий ChartRenderer с запущенными и прогретыми процессами или None,
+    если настройка CHART_RENDER_WARM_UP выключена
+
+    Вызывается при запуске сервера из wsgi.py и asgi.py, а не в AppConfig.ready,
+    чтобы команды manage.py и тесты не запускали пул процессов
+    '''
+    if not getattr(settings, 'CHART_RENDER_WARM_UP', False):
+        return None
+    renderer = get_renderer()
+    renderer.start()
+    return renderer
@@ -0,0 +1,101 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+# Уровни агрегации курсов: название -> период pandas, первый день которого - начало периода
+PERIODS = {
+    'week': 'W-SUN',
+    'month': 'M',
+}
+
+# Примерная длина периода в днях, по ней выбирается уровень для интервала
+PERIOD_DAYS = {
+    'week': 7,
+    'month': 30,
+}
+
+ROLLUP_COLUMNS = ['currency_code', 'period_start', 'first_date', 'last_date',
+                  'open', 'close', 'low', 'high', 'mean', 'days']
+
+
+def period_start(date: datetime.date, period: str) -> datetime.date:
+    '''
+    Takes: дата, уровень агрегации
+
+    Returns: первый день периода, в который попадает дата
+    '''
+    return pd.Period(date, PERIODS[period]).start_time.date()
+
+
+def period_end(date: datetime.date, period: str) -> datetime.date:
+    '''
+    Takes: дата, уровень агрегации
+
+    Returns: последний день периода, в который попадает дата
+    '''
+    return pd.Period(date, PERIODS[period]).end_time.date()
+
+
+def aggregate_periods(rates: pd.DataFrame, period: str) -> pd.DataFrame:
+    '''
+    Takes: DataFrame курсов с колонками currency_code, date, rate и уровень агрегации
+
+    Returns: DataFrame с колонками ROLLUP_COLUMNS: для каждой валюты и периода
+    даты первого и последнего курса, курсы открытия и закрытия, минимум, максимум,
+    среднее и число дней с курсом
+    '''
+    if rates.empty:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+    df = rates[['currency_code', 'date', 'rate']].sort_values(['currency_code', 'date'])
+    starts = pd.to_datetime(df['date']).dt.to_period(PERIODS[period]).dt.start_time.dt.date
+    return (
+        df.assign(period_start=starts.to_numpy())
+        .groupby(['currency_code', 'period_start'], sort=True)
+        .agg(first_date=('date', 'first'), last_date=('date', 'last'),
+             open=('rate', 'first'), close=('rate', 'last'),
+             low=('rate', 'min'), high=('rate', 'max'),
+             mean=('rate', 'mean'), days=('rate', 'size'))
+        .reset_index()[ROLLUP_COLUMNS]
+    )
+
+
+def choose_period(start_date: datetime.date, end_date: datetime.date, max_points: int) -> str | None:
+    '''
+    Takes: даты начала и конца интервала, максимальное число точек
+
+    Returns: самый подробный уровень агрегации, при котором точек не больше max_points,
+    None, если хватает дневных курсов. Если не хватает и месяцев, возвращает month
+    '''
+    days = (end_date - start_date).days + 1
+    if days <= max_points:
+        return None
+    for period, length in PERIOD_DAYS.items():
+        # +1 на неполные периоды по краям интервала
+        if -(-days // length) + 1 <= max_points:
+            return period
+    return 'month'
+
+
+def period_changes(rollups: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Takes: DataFrame агрегатов одной валюты в формате aggregate_periods, отсортированный по периодам
+
+    Returns: DataFrame с колонками period_start, last_date (последний день периода с курсом)
+    и change - среднее дневное относительное изменение курса за период (%)
+
+    Изменение за период считается от закрытия предыдущего периода (для первого - от открытия)
+    и переводится в среднее геометрическое за день, чтобы ряд был в тех же единицах,
+    что и дневные изменения
+    '''
+    close = rollups['close'].to_numpy(dtype=np.float64)
+    base = np.concatenate([rollups['open'].to_numpy(dtype=np.float64)[:1], close[:-1]])
+    steps = rollups['days'].to_numpy(dtype=np.float64)
+    if len(steps):
+        steps[0] -= 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = np.where(steps > 0, (np.power(close / base, 1 / steps) - 1) * 100, np.nan)
+    return pd.DataFrame({'period_start': rollups['period_start'].to_numpy(),
+                         'last_date': rollups['last_date'].to_numpy(),
+                         'change': change})
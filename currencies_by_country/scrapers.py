@@ -0,0 +1,210 @@
+import asyncio
+import datetime
+
+from django.core.cache import caches
+import numpy as np
+import pandas as pd
+
+from . import metrics, tables
+from .constants import tracked_currencies
+from .fetching import get_fetcher, open_async_fetcher
+
+IBAN_CURRENCY_CODES_URL = 'https://www.iban.ru/currency-codes'
+FINMARKET_RATES_URL = 'https://www.finmarket.ru/currency/rates/'
+
+CURRENCY_URL_CODES_KEY = 'finmarket_currency_url_codes'
+CURRENCY_URL_CODES_TIMEOUT = 24 * 60 * 60
+
+
+def parse_country_codes_page(content: bytes) -> pd.DataFrame:
+    '''
+    Takes: html-страница с кодами валют стран с iban.ru
+
+    Returns: DataFrame с колонками Страна, Валюта, Код, Номер,
+    отсортированный по стране и без строк с пустым кодом
+    '''
+    with metrics.span('parse'):
+        df = pd.DataFrame(tables.country_codes_table(content)).sort_values('Страна', ignore_index=True)
+        df = df[df['Код'] != '']
+    return df
+
+
+def scrape_country_codes() -> pd.DataFrame:
+    '''
+    Собирает с iban.ru информацию о кодах валют стран
+
+    Returns: DataFrame в формате parse_country_codes_page
+    '''
+    return parse_country_codes_page(get_fetcher().get(IBAN_CURRENCY_CODES_URL))
+
+
+async def scrape_country_codes_async() -> pd.DataFrame:
+    '''
+    Асинхронная версия scrape_country_codes, разбор страницы выполняется в отдельном потоке
+    '''
+    async with open_async_fetcher() as fetcher:
+        content = await fetcher.get(IBAN_CURRENCY_CODES_URL)
+    return await asyncio.to_thread(parse_country_codes_page, content)
+
+
+def parse_rates_page(content: bytes) -> tuple[list[datetime.date], np.ndarray]:
+    '''
+    Takes: html-страница архива курсов одной валюты с finmarket.ru
+
+    Returns: список дат и массив курсов, разобранные за один проход по таблице
+    '''
+    with metrics.span('parse'):
+        return tables.rates_table(content)
+
+
+def parse_currency_url_codes(content: bytes, currency_codes: list[str]) -> dict[str, str]:
+    '''
+    Takes: главная страница архива курсов finmarket.ru, ISO-коды валют
+
+    Returns: словарь ISO-код -> код валюты в url finmarket.ru
+    '''
+    return currency_url_codes(tables.select_options(content, 'cur'), currency_codes)
+
+
+def currency_url_codes(options: dict[str, str], currency_codes: list[str]) -> dict[str, str]:
+    '''
+    Takes: словарь название валюты на finmarket.ru -> код в url, ISO-коды валют
+
+    Returns: словарь ISO-код -> код валюты в url finmarket.ru
+    '''
+    tracked = tracked_currencies()
+    target_currencies = {tracked[code].lower(): code for code in currency_codes}
+
+    return {
+        target_currencies[text.lower()]: value
+        for text, value in options.items()
+        if text.lower() in target_currencies
+    }
+
+
+def get_currency_url_codes(currency_codes: list[str]) -> dict[str, str]:
+    '''
+    Takes: ISO-коды валют
+
+    Returns: словарь ISO-код -> код валюты в url finmarket.ru
+
+    Коды валют finmarket.ru почти не меняются, поэтому список вариантов
+    с главной страницы архива хранится в кэше CURRENCY_URL_CODES_TIMEOUT секунд
+    '''
+    cache = caches['default']
+    options = cache.get(CURRENCY_URL_CODES_KEY)
+    if options is None:
+        content = get_fetcher().get(finmarket_index_url())
+        options = tables.select_options(content, 'cur')
+        cache.set(CURRENCY_URL_CODES_KEY, options, CURRENCY_URL_CODES_TIMEOUT)
+    return currency_url_codes(options, currency_codes)
+
+
+async def get_currency_url_codes_async(currency_codes: list[str]) -> dict[str, str]:
+    '''
+    Асинхронная версия get_currency_url_codes
+    '''
+    cache = caches['default']
+    options = await cache.aget(CURRENCY_URL_CODES_KEY)
+    if options is None:
+        async with open_async_fetcher() as fetcher:
+            content = await fetcher.get(finmarket_index_url())
+        options = await asyncio.to_thread(tables.select_options, content, 'cur')
+        await cache.aset(CURRENCY_URL_CODES_KEY, options, CURRENCY_URL_CODES_TIMEOUT)
+    return currency_url_codes(options, currency_codes)
+
+
+def finmarket_index_url() -> str:
+    '''
+    Returns: url главной страницы архива курсов finmarket.ru
+    '''
+    return f'{FINMARKET_RATES_URL}?id=10148&pv=1#archive'
+
+
+def is_immutable(end_date: datetime.date) -> bool:
+    '''
+    Takes: дата конца интервала архива
+
+    Returns: True, если интервал целиком в прошлом и страница архива больше не изменится
+    '''
+    return end_date < datetime.date.today()
+
+
+def rates_archive_url(url_code: str, start_date: datetime.date, end_date: datetime.date) -> str:
+    '''
+    Takes: код валюты в url finmarket.ru, даты начала и конца интервала
+
+    Returns: url страницы архива курсов валюты за интервал
+    '''
+    bd, bm, by = start_date.day, start_date.month, start_date.year
+    ed, em, ey = end_date.day, end_date.month, end_date.year
+    return f'{FINMARKET_RATES_URL}?id=10148&pv=1&cur={url_code}&bd={bd}&bm={bm}&by={by}&ed={ed}&em={em}&ey={ey}#archive'
+
+
+def rates_frame(currency_codes: list[str],
+                pages: list[tuple[list[datetime.date], np.ndarray]]) -> pd.DataFrame:
+    '''
+    Takes: ISO-коды валют и разобранные parse_rates_page страницы архива в том же порядке
+
+    Returns: DataFrame с колонками currency_code, date (datetime.date), rate (float).
+    В df.attrs['currency_codes'] - ISO-коды валют, страницы которых скачаны,
+    в том числе валют без курсов за интервал
+    '''
+    # Даты и курсы уже разобраны parse_rates_page, здесь только склеиваются колонки
+    codes = [code for code, (date, _) in zip(currency_codes, pages) for _ in range(len(date))]
+    df = pd.DataFrame({
+        'currency_code': pd.Series(codes, dtype=object),
+        'date': pd.Series([day for date, _ in pages for day in date], dtype=object),
+        'rate': np.concatenate([rates for _, rates in pages]) if pages else np.array([], dtype=np.float64),
+    })
+    df.attrs['currency_codes'] = list(currency_codes)
+    return df
+
+
+def scrape_rates(start_date: datetime.date, end_date: datetime.date,
+                 currency_codes: list[str] | None = None) -> pd.DataFrame:
+    '''
+    Собирает с finmarket.ru курсы валют к рублю за интервал.
+    Страницы валют скачиваются и разбираются параллельно
+
+    Takes: даты начала и конца интервала, ISO-коды валют
+    (по умолчанию все отслеживаемые валюты)
+
+    Returns: DataFrame в формате rates_frame. Валюты, которых нет в списке
+    архива finmarket.ru, не скачиваются и не попадают в df.attrs['currency_codes']
+    '''
+    if currency_codes is None:
+        currency_codes = list(tracked_currencies())
+
+    url_codes = get_currency_url_codes(currency_codes)
+
+    with metrics.span('scrape'):
+        pages = get_fetcher().map(
+            parse_rates_page,
+            [rates_archive_url(url_code, start_date, end_date)
+             for url_code in url_codes.values()],
+            immutable=is_immutable(end_date),
+        )
+    return rates_frame(list(url_codes), pages)
+
+
+async def scrape_rates_async(start_date: datetime.date, end_date: datetime.date,
+                             currency_codes: list[str] | None = None) -> pd.DataFrame:
+    '''
+    Асинхронная версия scrape_rates: страницы скачиваются неблокирующим клиентом,
+    разбор выполняется в отдельных потоках
+    '''
+    if currency_codes is None:
+        currency_codes = list(tracked_currencies())
+
+    url_codes = await get_currency_url_codes_async(currency_codes)
+
+    with metrics.span('scrape'):
+        async with open_async_fetcher() as fetcher:
+            pages = await fetcher.map(
+                parse_rates_page,
+                [rates_archive_url(url_code, start_date, end_date)
+                 for url_code in url_codes.values()],
+                immutable=is_immutable(end_date),
+            )
+    return rates_frame(list(url_codes), pages)
@@ -0,0 +1,524 @@
+import asyncio
+import datetime
+import threading
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Q
+import numpy as np
+import pandas as pd
+
+from .constants import tracked_currencies
+from .models import CountryCodes, CurrencyRates, RateRollup, RatesCoverage
+from .singleflight import SingleFlight
+from .upsert import UpsertResult, bulk_upsert
+from .versions import COUNTRIES_VERSION_KEY, bump_data_version, data_version
+from . import metrics, ratestore, rollups, scrapers
+
+
+def save_country_codes(df: pd.DataFrame) -> UpsertResult:
+    '''
+    Takes: DataFrame с колонками Страна, Валюта, Код, Номер
+
+    Returns: UpsertResult
+
+    Синхронизирует коды валют стран в таблице CountryCodes и в той же транзакции
+    обновляет версию списка стран: country_index всех процессов строится заново
+    при следующем обращении
+    '''
+    objs = [
+        CountryCodes(country=country, currency=currency, code=code, number=number)
+        for country, currency, code, number
+        in df[['Страна', 'Валюта', 'Код', 'Номер']].itertuples(index=False)
+    ]
+    with transaction.atomic():
+        result = bulk_upsert(CountryCodes, objs, ['country'], ['currency', 'code', 'number'])
+        if result.inserted or result.updated:
+            bump_data_version(COUNTRIES_VERSION_KEY)
+    return result
+
+
+def save_rates(df: pd.DataFrame) -> UpsertResult:
+    '''
+    Takes: DataFrame курсов в формате scrapers.scrape_rates
+
+    Returns: UpsertResult
+
+    Синхронизирует курсы валют в таблице CurrencyRates, пересчитывает
+    недельные и месячные агрегаты затронутых периодов и при изменениях
+    в той же транзакции обновляет версию данных о курсах. Хранилище ratestore
+    с этого момента устарело, его пересобирают синхронизации (sync_rates,
+    sync_missing_rates) один раз после всех сохранений
+    '''
+    objs = [
+        CurrencyRates(currency_code=currency_code, date=date, rate=rate)
+        for currency_code, date, rate
+        in df[['currency_code', 'date', 'rate']].itertuples(index=False)
+    ]
+    with metrics.span('upsert'), transaction.atomic():
+        result = bulk_upsert(CurrencyRates, objs, ['currency_code', 'date'], ['rate'])
+        if result.inserted or result.updated:
+            RateRollup.refresh(sorted(set(df['currency_code'])), min(df['date']), max(df['date']))
+            bump_data_version()
+    return result
+
+
+def sync_country_codes() -> UpsertResult:
+    '''
+    Скачивает коды валют стран с iban.ru и сохраняет их в БД
+
+    Returns: UpsertResult
+    '''
+    return save_country_codes(scrapers.scrape_country_codes())
+
+
+def sync_rates(start_date: datetime.date, end_date: datetime.date,
+               currency_codes: list[str] | None = None,
+               rebuild_store: bool = True) -> UpsertResult:
+    '''
+    Takes: даты начала и конца интервала, ISO-коды валют
+    (по умолчанию все отслеживаемые валюты), флаг пересборки хранилища ratestore
+
+    Returns: UpsertResult
+
+    Заново скачивает с finmarket.ru весь интервал, даже если он уже скачивался.
+    Нужно для последних дней, курсы на которые могли появиться позже
+    '''
+    if currency_codes is None:
+        currency_codes = list(tracked_currencies())
+    df = scrapers.scrape_rates(start_date, end_date, currency_codes)
+    result = save_rates(df)
+    mark_covered(start_date, end_date, df.attrs['currency_codes'])
+    if rebuild_store:
+        transaction.on_commit(ratestore.ensure_built)
+    return result
+
+
+def mark_covered(start_date: datetime.date, end_date: datetime.date,
+                 currency_codes: list[str]):
+    '''
+    Takes: даты начала и конца скачанного интервала, ISO-коды скачанных валют
+    (df.attrs['currency_codes'] результата scrapers.scrape_rates)
+
+    Returns: None
+
+    Запоминает интервал в RatesCoverage. Сегодняшний день не запоминается,
+    так как курс на него может появиться позже. Интервалы валюты, пересекающиеся
+    с новым или примыкающие к нему, в той же транзакции объединяются с ним в одну строку,
+    поэтому число строк не растет от повторных синхронизаций
+    '''
+    end_date = min(end_date, datetime.date.today() - datetime.timedelta(days=1))
+    if start_date > end_date or not currency_codes:
+        return
+
+    one_day = datetime.timedelta(days=1)
+    merged = {code: (start_date, end_date) for code in currency_codes}
+    merged_ids = set()
+    with transaction.atomic():
+        # Объединенный интервал может дотянуться до следующих строк, поэтому поиск повторяется
+        while True:
+            touching = Q()
+            for code, (merged_start, merged_end) in merged.items():
+                touching |= Q(currency_code=code, start_date__lte=merged_end + one_day,
+                              end_date__gte=merged_start - one_day)
+            rows = list(
+                RatesCoverage.objects.select_for_update().filter(touching).exclude(id__in=merged_ids)
+                .values_list('id', 'currency_code', 'start_date', 'end_date')
+            )
+            if not rows:
+                break
+            for id, code, covered_start, covered_end in rows:
+                merged_start, merged_end = merged[code]
+                merged[code] = (min(merged_start, covered_start), max(merged_end, covered_end))
+                merged_ids.add(id)
+        RatesCoverage.objects.filter(id__in=merged_ids).delete()
+        RatesCoverage.objects.bulk_create(
+            RatesCoverage(currency_code=code, start_date=merged_start, end_date=merged_end)
+            for code, (merged_start, merged_end) in merged.items()
+        )
+
+
+def missing_intervals(start_date: datetime.date, end_date: datetime.date,
+                      currency_codes: list[str] | None = None
+                      ) -> dict[tuple[datetime.date, datetime.date], list[str]]:
+    '''
+    Takes: даты начала и конца интервала, ISO-коды валют
+    (по умолчанию все отслеживаемые валюты)
+
+    Returns: словарь интервал (начало, конец) -> список валют, за которые
+    этот интервал еще не скачивался с finmarket.ru
+    '''
+    if currency_codes is None:
+        currency_codes = list(tracked_currencies())
+
+    covered = {code: [] for code in currency_codes}
+    for code, covered_start, covered_end in (
+        RatesCoverage.objects.filter(currency_code__in=currency_codes,
+                                     start_date__lte=end_date, end_date__gte=start_date)
+        .order_by('start_date')
+        .values_list('currency_code', 'start_date', 'end_date')
+    ):
+        covered[code].append((covered_start, covered_end))
+
+    one_day = datetime.timedelta(days=1)
+    gaps = dict()
+    for code, intervals in covered.items():
+        cursor = start_date
+        for covered_start, covered_end in intervals:
+            if covered_start > cursor:
+                gaps.setdefault((cursor, covered_start - one_day), []).append(code)
+            cursor = max(cursor, covered_end + one_day)
+            if cursor > end_date:
+                break
+        if cursor <= end_date:
+            gaps.setdefault((cursor, end_date), []).append(code)
+    return gaps
+
+
+def has_missing_rates(start_date: datetime.date, end_date: datetime.date,
+                      currency_codes: list[str]) -> bool:
+    '''
+    Takes: даты начала и конца интервала, ISO-коды валют
+
+    Returns: True, если часть интервала еще не скачивалась с finmarket.ru.
+    Сегодняшний день не учитывается: mark_covered его не запоминает,
+    а курсы на него заново скачивает каждый запуск sync_currencies
+    '''
+    end_date = min(end_date, datetime.date.today() - datetime.timedelta(days=1))
+    return start_date <= end_date and bool(missing_intervals(start_date, end_date, currency_codes))
+
+
+# Одновременные синхронизации одного интервала выполняются один раз, в том числе в разных процессах
+rates_sync_flight = SingleFlight(lock_prefix='sync_missing_rates')
+
+
+def sync_key(start_date: datetime.date, end_date: datetime.date,
+             currency_codes: list[str] | None = None) -> str:
+    '''
+    Takes: даты начала и конца интервала, ISO-коды валют (None - все отслеживаемые)
+
+    Returns: ключ синхронизации, не зависящий от порядка и повторов валют
+    '''
+    codes = ','.join(sorted(set(currency_codes))) if currency_codes is not None else '*'
+    return f'{start_date.isoformat()}:{end_date.isoformat()}:{codes}'
+
+
+def sync_missing_rates(start_date: datetime.date, end_date: datetime.date,
+                       currency_codes: list[str] | None = None,
+                       rebuild_store: bool = True
+                       ) -> dict[tuple[datetime.date, datetime.date], list[str]]:
+    '''
+    Takes: даты начала и конца интервала, ISO-коды валют
+    (по умолчанию все отслеживаемые валюты), флаг пересборки хранилища ratestore
+
+    Returns: словарь скачанных интервалов и валют в формате missing_intervals
+
+    Скачивает с finmarket.ru только те части интервала, которых еще нет в БД,
+    и после всех интервалов один раз пересобирает хранилище ratestore.
+    Одновременные вызовы с тем же интервалом и валютами ждут уже идущую синхронизацию
+    и получают ее результат, в другом процессе - ждут ее и скачивают только то, что осталось
+    '''
+    def sync() -> dict[tuple[datetime.date, datetime.date], list[str]]:
+        gaps = missing_intervals(start_date, end_date, currency_codes)
+        for (gap_start, gap_end), codes in gaps.items():
+            df = scrapers.scrape_rates(gap_start, gap_end, codes)
+            save_rates(df)
+            # Валюты без страницы на finmarket.ru не запоминаются и будут запрошены снова
+            mark_covered(gap_start, gap_end, df.attrs['currency_codes'])
+        if gaps and rebuild_store:
+            transaction.on_commit(ratestore.ensure_built)
+        return gaps
+
+    return rates_sync_flight.do(sync_key(start_date, end_date, currency_codes), sync)
+
+
+async def sync_missing_rates_async(start_date: datetime.date, end_date: datetime.date,
+                                   currency_codes: list[str] | None = None
+                                   ) -> dict[tuple[datetime.date, datetime.date], list[str]]:
+    '''
+    Асинхронная версия sync_missing_rates: все недостающие интервалы скачиваются
+    одновременно неблокирующим клиентом, запись в БД выполняется в потоке.
+    Одновременные вызовы объединяются так же, как в sync_missing_rates
+    '''
+    async def sync() -> dict[tuple[datetime.date, datetime.date], list[str]]:
+        gaps = await sync_to_async(missing_intervals)(start_date, end_date, currency_codes)
+        frames = await asyncio.gather(*(
+            scrapers.scrape_rates_async(gap_start, gap_end, codes)
+            for (gap_start, gap_end), codes in gaps.items()
+        ))
+        for (gap_start, gap_end), df in zip(gaps, frames):
+            await sync_to_async(save_rates)(df)
+            await sync_to_async(mark_covered)(gap_start, gap_end, df.attrs['currency_codes'])
+        if gaps:
+            await sync_to_async(transaction.on_commit)(ratestore.ensure_built)
+        return gaps
+
+    return await rates_sync_flight.do_async(sync_key(start_date, end_date, currency_codes), sync)
+
+
+class CountryIndex:
+    '''
+    Индекс таблицы CountryCodes в памяти процесса: страна -> ISO-код валюты
+    и отсортированный список стран
+    '''
+
+    def __init__(self, rows: list[tuple[str, str]]):
+        self.codes = dict(rows)
+        self.countries = sorted(self.codes)
+
+    def resolve(self, countries: list[str], tracked: set[str]) -> tuple[dict[str, str], list[str]]:
+        '''
+        Takes: выбранные страны, ISO-коды отслеживаемых валют
+
+        Returns: словарь страна -> ISO-код для стран с отслеживаемыми валютами
+        и список остальных стран в порядке выбора
+        '''
+        country_codes = dict()
+        not_exists = []
+        for country in countries:
+            code = self.codes.get(country)
+            if code in tracked:
+                country_codes[country] = code
+            else:
+                not_exists.append(country)
+        return country_codes, not_exists
+
+
+_country_index: tuple[int, CountryIndex] | None = None
+_country_index_guard = threading.Lock()
+
+
+def country_index() -> CountryIndex:
+    '''
+    Returns: индекс CountryCodes для текущей версии списка стран
+
+    Индекс строится одним запросом и хранится в памяти процесса, пока версия списка стран
+    в DataVersion не изменится (save_country_codes в любом процессе или изменение CountryCodes
+    через ORM), поэтому при каждом обращении читается только версия
+    '''
+    global _country_index
+    version = data_version(COUNTRIES_VERSION_KEY)
+    with _country_index_guard:
+        if _country_index is None or _country_index[0] != version:
+            _country_index = (version, CountryIndex(CountryCodes.objects.values_list('country', 'code')))
+        return _country_index[1]
+
+
+def get_countries() -> list[str]:
+    '''
+    Returns: отсортированный список стран из таблицы CountryCodes (из country_index)
+    '''
+    return country_index().countries
+
+
+def resolve_countries(countries: list[str]) -> tuple[dict[str, str], list[str]]:
+    '''
+    Takes: список стран
+
+    Returns: словарь страна -> ISO-код для стран с отслеживаемыми валютами
+    и список стран без отслеживаемой валюты или неизвестных
+    '''
+    return country_index().resolve(countries, set(tracked_currencies()))
+
+
+def get_country_currency_codes(countries: list[str]) -> dict[str, str]:
+    '''
+    Takes: список стран
+
+    Returns: словарь страна -> ISO-код валюты для стран с отслеживаемыми валютами
+    '''
+    return resolve_countries(countries)[0]
+
+
+async def get_country_currency_codes_async(countries: list[str]) -> dict[str, str]:
+    '''
+    Асинхронная версия get_country_currency_codes, индекс при необходимости строится в потоке ORM
+    '''
+    return await sync_to_async(get_country_currency_codes)(countries)
+
+
+def get_rates(start_date: datetime.date, end_date: datetime.date,
+              currency_codes: list[str] | None = None,
+              fetch_missing: bool = True) -> pd.DataFrame:
+    '''
+    Takes: даты начала и конца интервала, ISO-коды валют
+    (по умолчанию все отслеживаемые валюты), флаг скачивания отсутствующих данных
+
+    Returns: DataFrame с колонкой Дата и колонками курсов по ISO-кодам валют
+
+    Читает только ряды запрошенных валют: из хранилища ratestore срезами без SQL
+    по курсам, если оно собрано по текущей версии данных и в нем есть все валюты,
+    иначе из таблицы CurrencyRates.
+    Если fetch_missing=True, предварительно скачивает с finmarket.ru еще не скачанные
+    части интервала
+    '''
+    if currency_codes is None:
+        currency_codes = list(tracked_currencies())
+    if fetch_missing:
+        sync_missing_rates(start_date, end_date, currency_codes)
+
+    store = ratestore.get_store()
+    if store is not None and set(currency_codes) <= set(store.currencies):
+        return rates_from_store(store, start_date, end_date, currency_codes)
+
+    rows = (
+        CurrencyRates.objects.filter(date__range=(start_date, end_date),
+                                     currency_code__in=currency_codes)
+        .values_list('date', 'currency_code', 'rate')
+    )
+    df = (
+        pd.DataFrame(list(rows), columns=['Дата', 'currency_code', 'rate'])
+        .pivot(index='Дата', columns='currency_code', values='rate')
+        .reindex(columns=currency_codes)
+        .sort_index()
+        .reset_index()
+    )
+    df.columns.name = None
+    return df
+
+
+def rates_from_store(store: ratestore.RateStore, start_date: datetime.date,
+                     end_date: datetime.date, currency_codes: list[str]) -> pd.DataFrame:
+    '''
+    Takes: хранилище курсов, даты начала и конца интервала, ISO-коды валют из хранилища
+
+    Returns: DataFrame в формате get_rates. Даты, на которые нет курса ни одной
+    из валют, пропускаются, как и при чтении из БД
+    '''
+    left, right = store.bounds(start_date, end_date)
+    positions = [store.currencies.index(code) for code in currency_codes]
+    columns = store.columns[positions, left:right]
+    has_rate = ~np.isnan(columns).all(axis=0)
+
+    df = pd.DataFrame({
+        'Дата': [datetime.date.fromordinal(int(day)) for day in store.days[left:right][has_rate]],
+        **{code: columns[i, has_rate] for i, code in enumerate(currency_codes)},
+    })
+    return df
+
+
+# На сколько дней назад искать курс для базовой даты без курса (выходные, праздники)
+BASE_RATE_LOOKBACK = datetime.timedelta(days=14)
+
+
+def get_changes_since(base_date: datetime.date, end_date: datetime.date,
+                      currency_codes: list[str] | None = None) -> pd.DataFrame:
+    '''
+    Takes: базовая дата, дата конца интервала, ISO-коды валют
+    (по умолчанию все отслеживаемые валюты)
+
+    Returns: DataFrame с индексом Дата и колонками ISO-кодов с относительными
+    изменениями курсов (%) от базовой даты
+
+    Изменения считаются на лету по накопленному логарифмическому индексу
+    L(t) = ln(курс(t)): изменение от X до t равно exp(L(t) - L(X)) - 1, поэтому
+    любая базовая дата - это одно вычитание на точку без записи в БД.
+    Если на базовую дату курса нет, берется последний курс до нее
+    '''
+    if currency_codes is None:
+        currency_codes = list(tracked_currencies())
+
+    df = get_rates(base_date - BASE_RATE_LOOKBACK, end_date, currency_codes,
+                   fetch_missing=False).set_index('Дата')
+    index = np.log(df.astype(float))
+    base = index[index.index <= base_date].ffill()
+    base = base.iloc[-1] if len(base) else pd.Series(np.nan, index=index.columns)
+
+    changes = np.expm1(index[index.index >= base_date] - base) * 100
+    changes.index.name = 'Дата'
+    return changes
+
+
+def get_period_changes(start_date: datetime.date, end_date: datetime.date,
+                       currency_codes: list[str], period: str) -> pd.DataFrame:
+    '''
+    Takes: даты начала и конца интервала, ISO-коды валют, уровень агрегации (week или month)
+
+    Returns: DataFrame с индексом Дата (последний день периода с курсом) и колонками
+    ISO-кодов со средними дневными относительными изменениями курсов за период (%)
+
+    Периоды, целиком лежащие в интервале, читаются из RateRollup, неполные периоды
+    на краях интервала агрегируются по дневным курсам, поэтому значения не зависят
+    от курсов за пределами интервала
+    '''
+    full_start = rollups.period_start(start_date, period)
+    if full_start != start_date:
+        full_start = rollups.period_end(start_date, period) + datetime.timedelta(days=1)
+    full_end = rollups.period_end(end_date, period)
+    if full_end != end_date:
+        full_end = rollups.period_start(end_date, period) - datetime.timedelta(days=1)
+
+    frames = []
+    if full_start <= full_end:
+        rows = RateRollup.objects.filter(
+            period=period, currency_code__in=currency_codes,
+            period_start__range=(full_start, full_end),
+        ).values_list(*rollups.ROLLUP_COLUMNS)
+        frames.append(pd.DataFrame(list(rows), columns=rollups.ROLLUP_COLUMNS))
+    else:
+        full_start, full_end = end_date + datetime.timedelta(days=1), end_date
+
+    # Неполные периоды по краям интервала
+    edges = CurrencyRates.objects.filter(currency_code__in=currency_codes).filter(
+        Q(date__range=(start_date, full_start - datetime.timedelta(days=1)))
+        | Q(date__range=(full_end + datetime.timedelta(days=1), end_date))
+    ).values_list('currency_code', 'date', 'rate')
+    frames.append(rollups.aggregate_periods(
+        pd.DataFrame(list(edges), columns=['currency_code', 'date', 'rate']), period))
+
+    df = pd.concat([frame for frame in frames if not frame.empty] or frames[-1:], ignore_index=True)
+    df = df.sort_values(['currency_code', 'period_start'])
+    changes = pd.concat(
+        [rollups.period_changes(group).assign(currency_code=code)
+         for code, group in df.groupby('currency_code')]
+        or [pd.DataFrame(columns=['period_start', 'last_date', 'change', 'currency_code'])],
+        ignore_index=True,
+    )
+
+    dates = changes.groupby('period_start')['last_date'].max()
+    result = (
+        changes.pivot(index='period_start', columns='currency_code', values='change')
+        .reindex(columns=currency_codes)
+        .sort_index()
+    )
+    result.index = pd.Index(dates.reindex(result.index).to_numpy(), name='Дата')
+    result.columns.name = None
+    return result.astype(float)
+
+
+def get_relative_changes(countries: list[str], start_date: datetime.date, end_date: datetime.date,
+                         max_points: int | None = None) -> pd.DataFrame:
+    '''
+    Takes: список стран, даты начала и конца интервала, максимальное число точек
+
+    Returns: DataFrame с индексом Дата и колонками стран с дневными относительными
+    изменениями курсов их валют (%). Страны без отслеживаемой валюты пропускаются
+
+    Если дней больше max_points, читаются недельные или месячные агрегаты из RateRollup
+    (см. get_period_changes). Если точек все еще больше max_points, соседние точки
+    объединяются в группы одинакового размера: значение группы - среднее изменение,
+    дата - последний день группы
+    '''
+    country_codes = get_country_currency_codes(countries)
+    countries = [country for country in countries if country in country_codes]
+    currency_codes = sorted(set(country_codes.values()))
+
+    with metrics.span('compute'):
+        period = rollups.choose_period(start_date, end_date, max_points) if max_points else None
+        if period is None:
+            df = get_rates(start_date, end_date, currency_codes, fetch_missing=False).set_index('Дата')
+            df = df.pct_change(fill_method=None) * 100
+        else:
+            df = get_period_changes(start_date, end_date, currency_codes, period)
+
+        changes = pd.DataFrame(
+            {country: df[country_codes[country]] for country in countries},
+            index=df.index,
+        )
+
+        if max_points and len(changes) > max_points:
+            group_size = -(-len(changes) // max_points)
+            groups = np.arange(len(changes)) // group_size
+            dates = changes.index.to_series().groupby(groups).last()
+            changes = changes.groupby(groups).mean().set_index(pd.Index(dates, name='Дата'))
+    return changes
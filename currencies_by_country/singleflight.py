@@ -0,0 +1,83 @@
+import asyncio
+import datetime
+import hashlib
+import threading
+import weakref
+from concurrent.futures import Future
+from typing import Awaitable, Callable, TypeVar
+
+from .locks import adb_lock, db_lock
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    '''
+    Объединяет одновременные одинаковые вызовы: пока вызов с ключом выполняется,
+    остальные вызовы с тем же ключом ждут его и получают тот же результат (или ту же ошибку).
+
+    В процессе вызовы объединяются между потоками (do) и между задачами event loop (do_async).
+    С lock_prefix выполняющий вызов дополнительно держит блокировку locks.db_lock, поэтому
+    такой же вызов в другом процессе ждет до lock_timeout секунд и выполняется после него,
+    уже по сохраненным в БД данным. Если блокировку не дождались, вызов выполняется без нее
+    '''
+
+    def __init__(self, lock_prefix: str | None = None, lock_timeout: float = 120,
+                 lock_ttl: datetime.timedelta = datetime.timedelta(minutes=10)):
+        self.lock_prefix = lock_prefix
+        self.lock_timeout = lock_timeout
+        self.lock_ttl = lock_ttl
+        self._calls: dict[str, Future] = dict()
+        self._guard = threading.Lock()
+        self._tasks = weakref.WeakKeyDictionary()
+
+    def lock_name(self, key: str) -> str:
+        '''
+        Returns: название блокировки SyncLock для ключа
+        '''
+        return f'{self.lock_prefix}:{hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]}'
+
+    def do(self, key: str, func: Callable[[], T]) -> T:
+        '''
+        Takes: ключ вызова и функция без аргументов
+
+        Returns: результат func: своего вызова или уже выполняющегося с тем же ключом
+        '''
+        with self._guard:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+
+        try:
+            if self.lock_prefix is None:
+                future.set_result(func())
+            else:
+                with db_lock(self.lock_name(key), self.lock_ttl, timeout=self.lock_timeout):
+                    future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._guard:
+                del self._calls[key]
+        return future.result()
+
+    async def do_async(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        '''
+        Асинхронная версия do: вызовы объединяются между задачами текущего event loop.
+        Отмена одного ожидающего не отменяет общий вызов
+        '''
+        tasks = self._tasks.setdefault(asyncio.get_running_loop(), dict())
+        task = tasks.get(key)
+        if task is None:
+            task = tasks[key] = asyncio.ensure_future(self._run_async(key, func))
+            task.add_done_callback(lambda _: tasks.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _run_async(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        if self.lock_prefix is None:
+            return await func()
+        async with adb_lock(self.lock_name(key), self.lock_ttl, timeout=self.lock_timeout):
+            return await func()
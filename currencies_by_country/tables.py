@@ -0,0 +1,115 @@
+import datetime
+from typing import Any, Callable
+
+from lxml import html
+import numpy as np
+
+
+def parse_html(content: bytes) -> html.HtmlElement:
+    '''
+    Takes: html-страница в utf-8
+
+    Returns: корневой элемент дерева lxml
+    '''
+    return html.fromstring(content, parser=html.HTMLParser(encoding='utf-8'))
+
+
+def parse_date(value: str) -> datetime.date:
+    '''
+    Takes: дата в формате DD.MM.YYYY
+
+    Returns: datetime.date
+    '''
+    value = value.strip()
+    return datetime.date(int(value[6:10]), int(value[3:5]), int(value[0:2]))
+
+
+def parse_decimal(value: str) -> float:
+    '''
+    Takes: число в русском формате, например "1 092,5058"
+
+    Returns: float
+    '''
+    return float(''.join(value.split()).replace(',', '.'))
+
+
+def find_table(root: html.HtmlElement, css_class: str | None = None) -> html.HtmlElement:
+    '''
+    Takes: корень дерева, класс таблицы (по умолчанию первая таблица страницы)
+
+    Returns: элемент table, если таблицы нет, вызывает ValueError
+    '''
+    if css_class is None:
+        tables = root.xpath('(//table)[1]')
+    else:
+        tables = root.xpath('//table[contains(concat(" ", normalize-space(@class), " "), $cls)]',
+                            cls=f' {css_class} ')
+    if not tables:
+        raise ValueError(f'Table with class {css_class} not found' if css_class else 'Table not found')
+    return tables[0]
+
+
+def table_header(table: html.HtmlElement) -> list[str]:
+    '''
+    Takes: элемент table
+
+    Returns: названия колонок из thead
+    '''
+    return [th.text_content().strip() for th in table.xpath('./thead//th')]
+
+
+def table_columns(table: html.HtmlElement, columns: dict[str, Callable[[str], Any]]) -> dict[str, list]:
+    '''
+    Takes: элемент table, словарь название колонки -> функция разбора ячейки
+
+    Returns: словарь название колонки -> список разобранных значений
+
+    Таблица проходится один раз: ячейки нужных колонок сразу разбираются,
+    без построения промежуточных списков строк и поиска индексов на каждой строке
+    '''
+    header = table_header(table)
+    positions = [(name, header.index(name), parse) for name, parse in columns.items()]
+    result = {name: [] for name in columns}
+
+    for row in table.xpath('./tbody/tr'):
+        cells = row.findall('td')
+        if len(cells) < len(header):
+            continue
+        for name, position, parse in positions:
+            result[name].append(parse(cells[position].text_content()))
+    return result
+
+
+def rates_table(content: bytes) -> tuple[list[datetime.date], np.ndarray]:
+    '''
+    Takes: html-страница архива курсов одной валюты с finmarket.ru
+
+    Returns: список дат и массив float64 курсов за одну единицу валюты
+
+    Часть валют (JPY, INR и другие) finmarket.ru котирует за 10, 100 и больше единиц,
+    поэтому курс делится на колонку Кол-во
+    '''
+    columns = table_columns(find_table(parse_html(content), 'karramba'),
+                            {'Дата': parse_date, 'Кол-во': parse_decimal, 'Курс': parse_decimal})
+    return columns['Дата'], (np.array(columns['Курс'], dtype=np.float64)
+                             / np.array(columns['Кол-во'], dtype=np.float64))
+
+
+def country_codes_table(content: bytes) -> dict[str, list[str]]:
+    '''
+    Takes: html-страница с кодами валют стран с iban.ru
+
+    Returns: словарь колонка -> значения для всех колонок таблицы
+    '''
+    table = find_table(parse_html(content))
+    return table_columns(table, {column: str.strip for column in table_header(table)})
+
+
+def select_options(content: bytes, name: str) -> dict[str, str]:
+    '''
+    Takes: html-страница, имя элемента select
+
+    Returns: словарь текст варианта -> value
+    '''
+    options = parse_html(content).xpath('//select[@name=$name]/option', name=name)
+    return {option.text_content().strip(): option.get('value') for option in options}
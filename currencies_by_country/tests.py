@@ -1,7 +1,53 @@
-from django.test import TestCase, Client
+from django.apps import apps as django_apps
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from unittest import skipUnless
 from unittest.mock import patch
+import asyncio
+import csv
+import datetime
 import json
+import importlib.util
+from io import BytesIO, StringIO
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from .models import CountryCodes, CurrencyRates, DataVersion, RateRollup, RatesCoverage, SyncLock
+from .constants import TRANS_CODES
+from . import (crossrates, export, fetching, httpcache, locks, metrics, ratestore, rendering, scrapers,
+               services, singleflight, tables, versions)
+from .benchmarks import fixture, parsing, pipeline, startup
+from .benchmarks.stub import StubServer
+
+
+def create_rates(date: datetime.date, **rates):
+    CurrencyRates.objects.bulk_create(
+        CurrencyRates(currency_code=code, date=date, rate=rate) for code, rate in rates.items()
+    )
+
+def scraped_rates(codes, rows=()) -> pd.DataFrame:
+    # Результат scrapers.scrape_rates: курсы и валюты, страницы которых скачаны
+    df = pd.DataFrame(list(rows), columns=['currency_code', 'date', 'rate'])
+    df.attrs['currency_codes'] = list(codes)
+    return df
+
+def reset_caches():
+    # Версии данных откатываются вместе с транзакцией теста, поэтому кэши
+    # прошлых тестов сбрасываются новыми версиями
+    caches['default'].clear()
+    versions.bump_data_version(versions.RATES_VERSION_KEY)
+    versions.bump_data_version(versions.COUNTRIES_VERSION_KEY)
+
 
 class TestViews(TestCase):
 
@@ -11,3 +57,1177 @@ class TestViews(TestCase):
     def test_redirect_to_main(self):
         response = self.client.get('/')
         self.assertEqual(response.status_code, 302)
+
+    @patch('currencies_by_country.services.sync_missing_rates')
+    def test_rates_interval_is_validated(self, sync_missing_rates):
+        for params in ({'bd': 'x', 'bm': 4, 'by': 2024, 'ed': 3, 'em': 4, 'ey': 2024},
+                       {'bd': 1, 'bm': 4, 'by': 2020, 'ed': 3, 'em': 4, 'ey': 2024}):
+            response = self.client.get('/api/GET/currency-rates/', params)
+            self.assertEqual(response.status_code, 404)
+        sync_missing_rates.assert_not_called()
+
+
+class TestDataAccess(TestCase):
+
+    def setUp(self):
+        reset_caches()
+        self.client = Client()
+        CountryCodes.objects.create(country='США', currency='Доллар США', code='USD', number='840')
+        CountryCodes.objects.create(country='Антарктида', currency='', code='AQD', number='000')
+        for day, usd in ((1, 90.1), (2, 91.2), (3, 92.3)):
+            create_rates(datetime.date(2024, 4, day), USD=usd, EUR=100.0, GBP=115.0,
+                         INR=1.1, CNY=12.5, TRY=2.8, JPY=60.0)
+        for code in TRANS_CODES:
+            RatesCoverage.objects.create(currency_code=code,
+                                         start_date=datetime.date(2024, 4, 1),
+                                         end_date=datetime.date(2024, 4, 3))
+
+    @patch('currencies_by_country.fetching.Fetcher.get', side_effect=AssertionError('unexpected HTTP request'))
+    def test_main_form_reads_countries_from_db(self, _):
+        # Версия списка стран и сам список
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('main_form'))
+        self.assertEqual(response.context['countries'], ['Антарктида', 'США'])
+
+    def test_selection_is_resolved_by_index(self):
+        services.get_countries()
+        # Только проверка версии списка стран
+        with self.assertNumQueries(1):
+            country_codes, not_exists = services.resolve_countries(['США', 'Антарктида', 'Атлантида', 'США'])
+        self.assertEqual(country_codes, {'США': 'USD'})
+        self.assertEqual(not_exists, ['Антарктида', 'Атлантида'])
+
+    def test_country_list_is_cached_until_sync(self):
+        services.get_countries()
+        with self.assertNumQueries(1):
+            self.client.get(reverse('main_form'))
+
+        services.save_country_codes(pd.DataFrame([
+            {'Страна': 'Япония', 'Валюта': 'Иена', 'Код': 'JPY', 'Номер': '392'},
+        ]))
+        self.assertEqual(services.get_countries(), ['Антарктида', 'США', 'Япония'])
+
+        # Изменения через ORM и админку тоже обновляют версию
+        CountryCodes.objects.create(country='Евросоюз', currency='Евро', code='EUR', number='978')
+        self.assertEqual(services.get_countries(), ['Антарктида', 'Евросоюз', 'США', 'Япония'])
+
+    def test_version_bumped_by_other_process(self):
+        self.assertEqual(services.get_countries(), ['Антарктида', 'США'])
+        self.assertEqual(services.resolve_countries(['Евросоюз'])[1], ['Евросоюз'])
+
+        # Так другой процесс (sync_currencies) сохраняет страны и фиксирует новую версию,
+        # индекс этого процесса о ней не знает
+        CountryCodes.objects.bulk_create([CountryCodes(country='Евросоюз', currency='Евро', code='EUR', number='978')])
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {DataVersion._meta.db_table} SET version = version + 1 WHERE name = %s',
+                           [versions.COUNTRIES_VERSION_KEY])
+
+        self.assertEqual(services.get_countries(), ['Антарктида', 'Евросоюз', 'США'])
+        self.assertEqual(services.resolve_countries(['Евросоюз']), ({'Евросоюз': 'EUR'}, []))
+
+    @patch('currencies_by_country.fetching.Fetcher.get', side_effect=AssertionError('unexpected HTTP request'))
+    def test_countries_rates_reads_rates_from_db(self, _):
+        response = self.client.post(reverse('coutries_and_rates'), {
+            'bd': 1, 'bm': 4, 'by': 2024, 'ed': 3, 'em': 4, 'ey': 2024,
+            'countries': ['США', 'Антарктида'],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['not_exists'], ['Антарктида'])
+
+    def test_get_rates_reads_only_requested_series(self):
+        df = services.get_rates(datetime.date(2024, 4, 1), datetime.date(2024, 4, 3), ['USD'])
+        self.assertEqual(list(df.columns), ['Дата', 'USD'])
+        self.assertEqual(df['USD'].to_list(), [90.1, 91.2, 92.3])
+
+
+class TestIncrementalSync(TestCase):
+
+    def setUp(self):
+        for code in ('USD', 'EUR'):
+            RatesCoverage.objects.create(currency_code=code,
+                                         start_date=datetime.date(2024, 1, 10),
+                                         end_date=datetime.date(2024, 1, 20))
+        RatesCoverage.objects.create(currency_code='USD',
+                                     start_date=datetime.date(2024, 1, 15),
+                                     end_date=datetime.date(2024, 2, 5))
+
+    def test_missing_intervals(self):
+        gaps = services.missing_intervals(datetime.date(2024, 1, 1), datetime.date(2024, 2, 10),
+                                          ['USD', 'EUR'])
+        self.assertEqual(gaps, {
+            (datetime.date(2024, 1, 1), datetime.date(2024, 1, 9)): ['USD', 'EUR'],
+            (datetime.date(2024, 2, 6), datetime.date(2024, 2, 10)): ['USD'],
+            (datetime.date(2024, 1, 21), datetime.date(2024, 2, 10)): ['EUR'],
+        })
+        self.assertEqual(
+            services.missing_intervals(datetime.date(2024, 1, 12), datetime.date(2024, 2, 1), ['USD']),
+            {},
+        )
+
+    @patch('currencies_by_country.scrapers.scrape_rates')
+    def test_repeated_sync_fetches_nothing(self, scrape_rates):
+        scrape_rates.side_effect = lambda start, end, codes: scraped_rates(codes)
+        services.sync_missing_rates(datetime.date(2024, 1, 1), datetime.date(2024, 2, 10))
+        self.assertEqual(scrape_rates.call_count, 4)
+
+        scrape_rates.reset_mock()
+        services.sync_missing_rates(datetime.date(2024, 1, 1), datetime.date(2024, 2, 10))
+        scrape_rates.assert_not_called()
+
+    @patch('currencies_by_country.scrapers.scrape_rates')
+    def test_currencies_without_page_are_not_covered(self, scrape_rates):
+        # У AUD нет страницы на finmarket.ru: scrape_rates ее пропускает
+        scrape_rates.side_effect = lambda start, end, codes: scraped_rates(
+            [code for code in codes if code != 'AUD'])
+        start, end = datetime.date(2024, 3, 1), datetime.date(2024, 3, 5)
+        services.sync_missing_rates(start, end, ['USD', 'AUD'])
+
+        self.assertEqual(services.missing_intervals(start, end, ['USD', 'AUD']), {(start, end): ['AUD']})
+        scrape_rates.side_effect = lambda start, end, codes: scraped_rates([])
+        services.sync_missing_rates(start, end, ['AUD'])
+        self.assertEqual(RatesCoverage.objects.filter(currency_code='AUD').count(), 0)
+
+    def test_coverage_is_merged(self):
+        services.mark_covered(datetime.date(2024, 1, 1), datetime.date(2024, 1, 9), [])
+        services.mark_covered(datetime.date(2024, 1, 1), datetime.date(2024, 1, 9), ['USD', 'EUR'])
+        services.mark_covered(datetime.date(2024, 2, 6), datetime.date(2024, 2, 10), ['USD'])
+        for _ in range(3):
+            services.mark_covered(datetime.date(2024, 2, 20), datetime.date(2024, 2, 25), ['USD'])
+
+        coverage = RatesCoverage.objects.order_by('currency_code', 'start_date').values_list(
+            'currency_code', 'start_date', 'end_date')
+        self.assertEqual(list(coverage), [
+            ('EUR', datetime.date(2024, 1, 1), datetime.date(2024, 1, 20)),
+            ('USD', datetime.date(2024, 1, 1), datetime.date(2024, 2, 10)),
+            ('USD', datetime.date(2024, 2, 20), datetime.date(2024, 2, 25)),
+        ])
+
+
+class TestSingleFlight(TestCase):
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = singleflight.SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return object()
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('2024-01-01:2024-02-10', compute)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(flight.do('2024-01-01:2024-02-10', compute)))
+                     for _ in range(5)]
+        for thread in followers:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in (leader, *followers):
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 6)
+        self.assertTrue(all(result is results[0] for result in results))
+
+        # Завершенный вызов не кэшируется
+        flight.do('2024-01-01:2024-02-10', compute)
+        self.assertEqual(len(calls), 2)
+
+    def test_waits_for_other_process(self):
+        flight = singleflight.SingleFlight(lock_prefix='test', lock_timeout=5)
+        SyncLock.objects.create(name=flight.lock_name('key'), token='other',
+                                expires_at=timezone.now() + datetime.timedelta(seconds=0.3))
+        started = time.monotonic()
+        self.assertEqual(flight.do('key', lambda: 'done'), 'done')
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertFalse(SyncLock.objects.exists())
+
+    def test_sync_key_is_normalized(self):
+        start, end = datetime.date(2024, 1, 1), datetime.date(2024, 2, 10)
+        self.assertEqual(services.sync_key(start, end, ['USD', 'EUR', 'USD']),
+                         services.sync_key(start, end, ['EUR', 'USD']))
+        self.assertNotEqual(services.sync_key(start, end, ['EUR']), services.sync_key(start, end))
+
+    @patch('currencies_by_country.scrapers.scrape_rates_async')
+    async def test_concurrent_async_syncs_scrape_once(self, scrape_rates_async):
+        async def scrape(*args):
+            await asyncio.sleep(0.05)
+            return scraped_rates(args[2])
+        scrape_rates_async.side_effect = scrape
+
+        start, end = datetime.date(2024, 4, 1), datetime.date(2024, 4, 3)
+        results = await asyncio.gather(*(services.sync_missing_rates_async(start, end, ['USD', 'EUR'])
+                                         for _ in range(5)))
+
+        self.assertEqual(scrape_rates_async.call_count, 1)
+        self.assertTrue(all(result == results[0] for result in results))
+
+
+class TestBulkUpsert(TestCase):
+
+    def rates_frame(self, days, rate):
+        return pd.DataFrame([
+            {'currency_code': code, 'date': datetime.date(2024, 4, day), 'rate': rate}
+            for day in days for code in TRANS_CODES
+        ])
+
+    def test_save_rates_reports_counts(self):
+        # Транзакция (2 запроса), 4 запроса на курсы, 5 на пересчет агрегатов и версия данных
+        with self.assertNumQueries(12):
+            result = services.save_rates(self.rates_frame(range(1, 31), 90.0))
+        self.assertEqual(result, services.UpsertResult(inserted=210, updated=0))
+
+        result = services.save_rates(self.rates_frame(range(25, 31), 95.0))
+        self.assertEqual(result, services.UpsertResult(inserted=0, updated=42))
+        self.assertEqual(CurrencyRates.objects.count(), 210)
+        self.assertEqual(CurrencyRates.objects.get(currency_code='USD', date='2024-04-30').rate, 95.0)
+
+    def test_save_country_codes_updates_existing_country(self):
+        CountryCodes.objects.create(country='США', currency='', code='', number='')
+        df = pd.DataFrame({'Страна': ['США', 'Япония'], 'Валюта': ['Доллар США', 'Иена'],
+                           'Код': ['USD', 'JPY'], 'Номер': ['840', '392']})
+        result = services.save_country_codes(df)
+        self.assertEqual(result, services.UpsertResult(inserted=1, updated=1))
+        self.assertEqual(CountryCodes.objects.get(country='США').code, 'USD')
+
+
+class TestRollups(TestCase):
+
+    def setUp(self):
+        reset_caches()
+
+    def test_rollups_follow_new_rates(self):
+        services.save_rates(pd.DataFrame([
+            {'currency_code': 'USD', 'date': datetime.date(2024, 4, day), 'rate': 90.0 + day}
+            for day in range(1, 31)
+        ]))
+        week = RateRollup.objects.get(currency_code='USD', period='week', period_start=datetime.date(2024, 4, 22))
+        self.assertEqual((week.open, week.close, week.low, week.high, week.days), (112.0, 118.0, 112.0, 118.0, 7))
+        self.assertEqual(week.mean, 115.0)
+        month = RateRollup.objects.get(currency_code='USD', period='month')
+        self.assertEqual((month.first_date, month.last_date, month.days),
+                         (datetime.date(2024, 4, 1), datetime.date(2024, 4, 30), 30))
+
+        services.save_rates(pd.DataFrame([
+            {'currency_code': 'USD', 'date': datetime.date(2024, 4, 24), 'rate': 200.0},
+        ]))
+        week.refresh_from_db()
+        self.assertEqual(week.high, 200.0)
+        self.assertEqual(RateRollup.objects.get(currency_code='USD', period='month').high, 200.0)
+
+    def test_migration_builds_same_rollups(self):
+        build_rollups = importlib.import_module('currencies_by_country.migrations.0009_raterollup').build_rollups
+        services.save_rates(pd.DataFrame([
+            {'currency_code': code, 'date': datetime.date(2024, 3, 20) + datetime.timedelta(days=day),
+             'rate': 90.0 + day % 7}
+            for day in range(40) for code in ('USD', 'EUR')
+        ]))
+        fields = ['currency_code', 'period', 'period_start', 'first_date', 'last_date',
+                  'open', 'close', 'low', 'high', 'mean', 'days']
+        expected = list(RateRollup.objects.order_by(*fields[:3]).values_list(*fields))
+
+        RateRollup.objects.all().delete()
+        build_rollups(django_apps, None)
+        self.assertEqual(list(RateRollup.objects.order_by(*fields[:3]).values_list(*fields)), expected)
+
+    def test_rates_before_per_unit_are_reset(self):
+        reset_rates = importlib.import_module('currencies_by_country.migrations.0011_rescrape_rates_per_unit').reset_rates
+        services.save_rates(pd.DataFrame([
+            {'currency_code': 'JPY', 'date': datetime.date(2024, 4, day), 'rate': 60.0} for day in (1, 2)
+        ]))
+        services.mark_covered(datetime.date(2024, 4, 1), datetime.date(2024, 4, 2), ['JPY'])
+        version = services.data_version()
+
+        reset_rates(django_apps, connection.schema_editor())
+
+        self.assertFalse(CurrencyRates.objects.exists())
+        self.assertFalse(RateRollup.objects.exists())
+        self.assertFalse(RatesCoverage.objects.exists())
+        self.assertNotEqual(services.data_version(), version)
+
+    def test_long_intervals_read_rollups(self):
+        services.save_rates(pd.DataFrame([
+            {'currency_code': 'USD', 'date': datetime.date(2022, 5, 1) + datetime.timedelta(days=day),
+             'rate': 100.0 * 1.001 ** day}
+            for day in range(730)
+        ]))
+        CountryCodes.objects.create(country='США', currency='Доллар США', code='USD', number='840')
+        start, end = datetime.date(2022, 5, 10), datetime.date(2024, 4, 20)
+
+        weekly = services.get_relative_changes(['США'], start, end, max_points=200)
+        monthly = services.get_relative_changes(['США'], start, end, max_points=30)
+
+        self.assertEqual(len(weekly), 102)
+        self.assertEqual(weekly.index[0], datetime.date(2022, 5, 15))
+        self.assertEqual(weekly.index[-1], end)
+        self.assertEqual(len(monthly), 24)
+        for changes in (weekly, monthly):
+            self.assertTrue(np.allclose(changes['США'], 0.1))
+
+    def test_short_intervals_read_daily_rates(self):
+        with patch.object(services, 'get_period_changes') as get_period_changes:
+            services.get_relative_changes(['США'], datetime.date(2024, 4, 1), datetime.date(2024, 4, 30), 100)
+        get_period_changes.assert_not_called()
+
+
+class TestRelativeChanges(TestCase):
+
+    def setUp(self):
+        for day, usd, eur in ((1, 80.0, 100.0), (2, 88.0, 95.0), (3, 100.0, 110.0), (4, 60.0, 50.0)):
+            create_rates(datetime.date(2024, 4, day), USD=usd, EUR=eur)
+        create_rates(datetime.date(2024, 4, 3), GBP=1.0)
+
+    def test_changes_since_any_base_date(self):
+        with self.assertNumQueries(1):
+            first = services.get_changes_since(datetime.date(2024, 4, 1), datetime.date(2024, 4, 4), ['USD', 'EUR'])
+        second = services.get_changes_since(datetime.date(2024, 4, 2), datetime.date(2024, 4, 3), ['USD'])
+
+        self.assertEqual(first.index.tolist(), [datetime.date(2024, 4, day) for day in range(1, 5)])
+        self.assertTrue(np.allclose(first['USD'], [0, 10, 25, -25]))
+        self.assertTrue(np.allclose(first['EUR'], [0, -5, 10, -50]))
+        self.assertTrue(np.allclose(second['USD'], [0, (100 / 88 - 1) * 100]))
+
+    def test_base_date_without_rate_uses_previous_rate(self):
+        changes = services.get_changes_since(datetime.date(2024, 4, 5), datetime.date(2024, 4, 10), ['USD'])
+        self.assertTrue(changes.empty)
+
+        create_rates(datetime.date(2024, 4, 8), USD=90.0)
+        changes = services.get_changes_since(datetime.date(2024, 4, 6), datetime.date(2024, 4, 10), ['USD'])
+        self.assertEqual(changes.index.tolist(), [datetime.date(2024, 4, 8)])
+        self.assertAlmostEqual(changes['USD'].iloc[0], 50.0)
+
+    def test_changes_since_api(self):
+        response = self.client.get(reverse('changes_since'), {
+            'bd': 2, 'bm': 4, 'by': 2024, 'ed': 4, 'em': 4, 'ey': 2024, 'currencies': ['EUR', 'GBP'],
+        })
+        data = response.json()
+        self.assertEqual(data['base_date'], '2024-04-02')
+        self.assertEqual(data['dates'], ['2024-04-02', '2024-04-03', '2024-04-04'])
+        self.assertAlmostEqual(data['series']['EUR'][1], (110 / 95 - 1) * 100)
+        self.assertEqual(data['series']['GBP'], [None, None, None])
+
+        response = self.client.get(reverse('changes_since'), {
+            'bd': 2, 'bm': 4, 'by': 2024, 'ed': 4, 'em': 4, 'ey': 2024, 'currencies': ['XXX'],
+        })
+        self.assertEqual(response.status_code, 404)
+
+
+FINMARKET_INDEX = """
+<select name="cur">{options}</select>
+""".format(options=''.join(
+    f'<option value="{number}">{name}</option>'
+    for number, name in enumerate(
+        ['Доллар США', 'ЕВРО', 'Фунт стерлингов', 'Индийская рупия',
+         'Китайский юань Жэньминьби', 'Турецкая лира', 'Японская йена', 'Австралийский доллар'],
+        start=52100,
+    )
+))
+
+FINMARKET_ARCHIVE = """
+<table class="karramba">
+<thead><tr><th>Дата</th><th>Кол-во</th><th>Курс</th><th>Изменение</th></tr></thead>
+<tbody>
+<tr><td>01.04.2024</td><td>1</td><td>{rate},10</td><td>0</td></tr>
+<tr><td>02.04.2024</td><td>1</td><td>{rate},20</td><td>0,1</td></tr>
+</tbody>
+</table>
+"""
+
+# Архив валюты, которую finmarket.ru котирует за 100 единиц (как JPY)
+RATES_PER_100 = """
+<table class="karramba">
+<thead><tr><th>Дата</th><th>Кол-во</th><th>Курс</th><th>Изменение</th></tr></thead>
+<tbody>
+<tr><td>01.04.2024</td><td>100</td><td>60,50</td><td>0</td></tr>
+<tr><td>02.04.2024</td><td>100</td><td>61,00</td><td>0,5</td></tr>
+</tbody>
+</table>
+"""
+
+
+class StubFinmarketHandler(BaseHTTPRequestHandler):
+    delay = 0.3
+    failures_left = 0
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        with self.server.lock:
+            self.server.paths.append(self.path)
+        etag = f'"{query["cur"][0]}"' if 'cur' in query else None
+        if etag is not None and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        if 'cur' not in query:
+            body = FINMARKET_INDEX
+        else:
+            cls = type(self)
+            with self.server.lock:
+                fail = cls.failures_left > 0
+                cls.failures_left -= fail
+            if fail:
+                self.send_response(503)
+                self.end_headers()
+                return
+            time.sleep(self.delay)
+            body = FINMARKET_ARCHIVE.format(rate=query['cur'][0][-2:])
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        if etag is not None:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body.encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_server(test: TestCase) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubFinmarketHandler)
+    server.lock = threading.Lock()
+    server.paths = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test.addCleanup(server.server_close)
+    test.addCleanup(server.shutdown)
+    return server
+
+
+class TestConcurrentScraping(TestCase):
+
+    def setUp(self):
+        reset_caches()
+        self.server = start_stub_server(self)
+
+        url = f'http://127.0.0.1:{self.server.server_port}/currency/rates/'
+        fetcher = fetching.Fetcher(backoff_factor=0.01)
+        for patcher in (patch.object(scrapers, 'FINMARKET_RATES_URL', url),
+                        patch.object(scrapers, 'get_fetcher', return_value=fetcher)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_pages_are_fetched_concurrently(self):
+        started = time.monotonic()
+        df = scrapers.scrape_rates(datetime.date(2024, 4, 1), datetime.date(2024, 4, 2))
+        elapsed = time.monotonic() - started
+
+        # Страницы всех валют на одном хосте скачиваются одной волной
+        self.assertLess(elapsed, StubFinmarketHandler.delay * 1.8)
+        usd = df[df['currency_code'] == 'USD']
+        self.assertEqual(usd['date'].to_list(), [datetime.date(2024, 4, 1), datetime.date(2024, 4, 2)])
+        self.assertEqual(usd['rate'].to_list(), [0.1, 0.2])
+        self.assertEqual(set(df['currency_code']), set(TRANS_CODES))
+
+    @override_settings(TRACKED_CURRENCIES={**TRANS_CODES, 'AUD': 'Австралийский доллар'})
+    def test_any_finmarket_currency_can_be_tracked(self):
+        df = scrapers.scrape_rates(datetime.date(2024, 4, 1), datetime.date(2024, 4, 2), ['AUD'])
+        self.assertEqual(df['currency_code'].to_list(), ['AUD', 'AUD'])
+        self.assertEqual(df['rate'].to_list(), [7.1, 7.2])
+
+    @override_settings(TRACKED_CURRENCIES={**TRANS_CODES, 'XXX': 'Нет на finmarket'})
+    def test_currencies_without_page_are_not_reported(self):
+        df = scrapers.scrape_rates(datetime.date(2024, 4, 1), datetime.date(2024, 4, 2), ['USD', 'XXX'])
+        self.assertEqual(df.attrs['currency_codes'], ['USD'])
+
+    def open_async_fetcher(self):
+        fetcher = fetching.AsyncFetcher(backoff_factor=0.01)
+        self.async_fetchers.append(fetcher)
+        return fetcher
+
+    async def test_async_pages_are_fetched_concurrently(self):
+        self.async_fetchers = []
+        with patch.object(scrapers, 'open_async_fetcher', self.open_async_fetcher):
+            started = time.monotonic()
+            df = await scrapers.scrape_rates_async(datetime.date(2024, 4, 1), datetime.date(2024, 4, 2))
+            elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, StubFinmarketHandler.delay * 1.8)
+        self.assertEqual(len(df), 14)
+        # Клиенты httpx не переживают вызов, иначе каждый запрос под WSGI оставлял бы открытые сокеты
+        self.assertTrue(self.async_fetchers)
+        self.assertTrue(all(fetcher.client.is_closed for fetcher in self.async_fetchers))
+
+    async def test_async_server_errors_are_retried(self):
+        StubFinmarketHandler.failures_left = 2
+        self.addCleanup(setattr, StubFinmarketHandler, 'failures_left', 0)
+        self.async_fetchers = []
+        with patch.object(scrapers, 'open_async_fetcher', self.open_async_fetcher):
+            df = await scrapers.scrape_rates_async(datetime.date(2024, 4, 1), datetime.date(2024, 4, 2))
+        self.assertEqual(len(df), 14)
+
+    def test_server_errors_are_retried(self):
+        StubFinmarketHandler.failures_left = 2
+        self.addCleanup(setattr, StubFinmarketHandler, 'failures_left', 0)
+        df = scrapers.scrape_rates(datetime.date(2024, 4, 1), datetime.date(2024, 4, 2))
+        self.assertEqual(len(df), 14)
+
+
+class TestBenchmarks(TestCase):
+
+    def test_pipeline_stages_are_measured(self):
+        with StubServer() as server:
+            results = pipeline.run_scale('1m', server, repeat=1)
+
+        self.assertEqual([result['stage'] for result in results], pipeline.STAGES)
+        self.assertTrue(all(result['seconds'] > 0 for result in results))
+        self.assertEqual(results[0]['rows'], 26 * len(TRANS_CODES))
+        self.assertFalse(CurrencyRates.objects.exists())
+
+    def test_regressions_are_flagged(self):
+        results = [{'name': 'parse_1m', 'seconds': 0.3}, {'name': 'render_1m', 'seconds': 0.1},
+                   {'name': 'scrape_1m', 'seconds': 1.0}]
+        regressions = pipeline.compare(results, {'parse_1m': 0.1, 'render_1m': 0.1}, tolerance=0.5)
+        self.assertEqual([regression['name'] for regression in regressions], ['parse_1m'])
+        self.assertAlmostEqual(regressions[0]['ratio'], 3.0)
+
+
+class TestStartup(TestCase):
+
+    def test_urls_do_not_import_heavy_modules(self):
+        result = startup.measure_startup([])
+        self.assertEqual(result['heavy'], [])
+
+    def test_views_are_composed_from_modules(self):
+        from .views import GetterCurrencies, analytics, charts, scraping
+
+        self.assertIs(GetterCurrencies.get_rates, scraping.ScrapingViews.get_rates)
+        self.assertIs(GetterCurrencies.get_changes_since, analytics.AnalyticsViews.get_changes_since)
+        self.assertIs(GetterCurrencies.get_chart, charts.ChartViews.get_chart)
+
+
+class TestHttpCache(TestCase):
+
+    def setUp(self):
+        reset_caches()
+        self.server = start_stub_server(self)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/currency/rates/'
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.fetcher = fetching.Fetcher(backoff_factor=0.01, cache=httpcache.HttpCache(directory.name))
+        StubFinmarketHandler.delay = 0
+        self.addCleanup(setattr, StubFinmarketHandler, 'delay', 0.3)
+
+    def test_immutable_pages_are_fetched_once(self):
+        url = f'{self.url}?cur=52100'
+        first = self.fetcher.get(url, immutable=True)
+        second = self.fetcher.get(url, immutable=True)
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.server.paths), 1)
+
+    def test_changing_pages_are_revalidated(self):
+        url = f'{self.url}?cur=52100'
+        first = self.fetcher.get(url)
+        with patch.object(self.fetcher.session, 'get', wraps=self.fetcher.session.get) as get:
+            second = self.fetcher.get(url)
+
+        self.assertEqual(first, second)
+        self.assertEqual(get.call_args.kwargs['headers'], {'If-None-Match': '"52100"'})
+        self.assertEqual(len(self.server.paths), 2)
+
+    async def test_async_fetcher_shares_cache(self):
+        url = f'{self.url}?cur=52100'
+        body = self.fetcher.get(url, immutable=True)
+        async with fetching.AsyncFetcher(cache=self.fetcher.cache) as fetcher:
+            self.assertEqual(await fetcher.get(url, immutable=True), body)
+        self.assertEqual(len(self.server.paths), 1)
+
+    def test_currency_url_codes_are_cached(self):
+        with patch.object(scrapers, 'FINMARKET_RATES_URL', self.url), \
+                patch.object(scrapers, 'get_fetcher', return_value=self.fetcher):
+            scrapers.scrape_rates(datetime.date(2024, 4, 1), datetime.date(2024, 4, 2), ['USD'])
+            scrapers.scrape_rates(datetime.date(2024, 4, 1), datetime.date(2024, 4, 2), ['EUR'])
+
+        index_requests = [path for path in self.server.paths if 'cur=' not in path]
+        self.assertEqual(len(index_requests), 1)
+
+
+class TestTables(TestCase):
+
+    def test_rates_page_matches_previous_parser(self):
+        content = fixture('finmarket_archive_2y.html')
+        expected = parsing.bs4_parse_rates_page(content)
+
+        df = parsing.lxml_parse_rates_page(content)
+
+        self.assertEqual(df['date'].tolist(), expected['date'].tolist())
+        self.assertEqual(df['rate'].tolist(), expected['rate'].tolist())
+        self.assertEqual(df['rate'].dtype, float)
+
+    def test_country_codes_page_matches_previous_parser(self):
+        content = fixture('iban_currency_codes.html')
+        pd.testing.assert_frame_equal(scrapers.parse_country_codes_page(content),
+                                      parsing.bs4_parse_country_codes_page(content))
+
+    def test_currency_url_codes(self):
+        codes = scrapers.parse_currency_url_codes(fixture('finmarket_index.html'), ['USD', 'EUR'])
+        self.assertEqual(codes, {'USD': '52013', 'EUR': '52014'})
+
+    def test_rates_are_per_unit(self):
+        dates, rates = scrapers.parse_rates_page(RATES_PER_100.encode('utf-8'))
+        self.assertEqual(dates, [datetime.date(2024, 4, 1), datetime.date(2024, 4, 2)])
+        np.testing.assert_allclose(rates, [0.605, 0.61])
+
+    def test_decimal_with_thousands_separator(self):
+        self.assertEqual(tables.parse_decimal('1\xa0092,5058'), 1092.5058)
+        self.assertEqual(tables.parse_decimal(' 92,1 '), 92.1)
+
+    def test_missing_table(self):
+        with self.assertRaises(ValueError):
+            scrapers.parse_rates_page(b'<html><body><p>ok</p></body></html>')
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-default'},
+    'charts': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-charts'},
+}, CHART_RENDER_WORKERS=0)
+class TestChartCache(TestCase):
+
+    params = {'bd': 1, 'bm': 4, 'by': 2024, 'ed': 3, 'em': 4, 'ey': 2024}
+
+    def setUp(self):
+        reset_caches()
+        caches['charts'].clear()
+        self.client = Client()
+        CountryCodes.objects.create(country='США', currency='Доллар США', code='USD', number='840')
+        CountryCodes.objects.create(country='Евросоюз', currency='Евро', code='EUR', number='978')
+        for day in (1, 2, 3):
+            create_rates(datetime.date(2024, 4, day), USD=90.0 + day, EUR=100.0 - day)
+
+    @patch('currencies_by_country.rendering.render_chart', return_value=b'png')
+    def test_chart_is_rendered_once_for_any_country_order(self, render_chart):
+        first = self.client.get(reverse('chart'), {**self.params, 'countries': ['США', 'Евросоюз']})
+        second = self.client.get(reverse('chart'), {**self.params, 'countries': ['Евросоюз', 'США']})
+
+        self.assertEqual(render_chart.call_count, 1)
+        self.assertEqual(first.content, b'png')
+        self.assertEqual(first['Content-Type'], 'image/png')
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertIn('max-age', first['Cache-Control'])
+
+        not_modified = self.client.get(reverse('chart'), {**self.params, 'countries': ['США']},
+                                       HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 200)
+        not_modified = self.client.get(reverse('chart'), {**self.params, 'countries': ['США', 'Евросоюз']},
+                                       HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(render_chart.call_count, 2)
+
+    @patch('currencies_by_country.rendering.render_chart', return_value=b'png')
+    def test_new_rates_invalidate_charts(self, render_chart):
+        first = self.client.get(reverse('chart'), {**self.params, 'countries': ['США']})
+        services.save_rates(pd.DataFrame([
+            {'currency_code': 'USD', 'date': datetime.date(2024, 4, 3), 'rate': 95.0},
+        ]))
+        second = self.client.get(reverse('chart'), {**self.params, 'countries': ['США']})
+
+        self.assertEqual(render_chart.call_count, 2)
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    @patch('currencies_by_country.rendering.render_chart', return_value=b'png')
+    def test_rates_synced_by_other_process_invalidate_charts(self, render_chart):
+        first = self.client.get(reverse('chart'), {**self.params, 'countries': ['США']})
+        self.assertIn('max-age=0', first['Cache-Control'])
+
+        # Так другой процесс (sync_currencies) фиксирует новые курсы
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {DataVersion._meta.db_table} SET version = version + 1 WHERE name = %s',
+                           [versions.RATES_VERSION_KEY])
+        second = self.client.get(reverse('chart'), {**self.params, 'countries': ['США']},
+                                 HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(first['ETag'], second['ETag'])
+        self.assertEqual(render_chart.call_count, 2)
+
+        # С текущей версией в url график можно хранить в браузере, url изменится вместе с данными
+        versioned = self.client.get(reverse('chart'), {**self.params, 'countries': ['США'],
+                                                       'v': versions.chart_version()})
+        self.assertNotIn('max-age=0', versioned['Cache-Control'])
+        self.assertEqual(render_chart.call_count, 2)
+
+    @patch('currencies_by_country.rendering.render_chart', return_value=b'png')
+    def test_new_country_codes_invalidate_charts(self, render_chart):
+        params = {**self.params, 'countries': ['США']}
+        first = self.client.get(reverse('chart'), {**params, 'v': versions.chart_version()})
+        self.assertNotIn('max-age=0', first['Cache-Control'])
+
+        # Страна стала соответствовать другой валюте
+        services.save_country_codes(pd.DataFrame({'Страна': ['США'], 'Валюта': ['Евро'],
+                                                  'Код': ['EUR'], 'Номер': ['978']}))
+        second = self.client.get(reverse('chart'), params, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(first['ETag'], second['ETag'])
+        self.assertEqual(render_chart.call_count, 2)
+        stale = self.client.get(reverse('chart'), {**params, 'v': first.wsgi_request.GET['v']})
+        self.assertIn('max-age=0', stale['Cache-Control'])
+
+    def test_rendered_chart_is_png(self):
+        response = self.client.get(reverse('chart'), {**self.params, 'countries': ['США']})
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+
+    @patch('currencies_by_country.rendering.ChartRenderer.render',
+           side_effect=rendering.RenderUnavailable('Chart render queue is full'))
+    def test_overloaded_renderer_returns_503(self, _):
+        response = self.client.get(reverse('chart'), {**self.params, 'countries': ['США']})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+
+class TestChartRenderer(TestCase):
+
+    changes = pd.DataFrame({'США': [0.0, 1.5, -0.5]},
+                           index=pd.to_datetime(['2024-04-01', '2024-04-02', '2024-04-03']))
+
+    def renderer(self, **kwargs) -> rendering.ChartRenderer:
+        renderer = rendering.ChartRenderer(**{'workers': 1, 'max_pending': 4, 'timeout': 60, **kwargs})
+        self.addCleanup(renderer.shutdown)
+        return renderer
+
+    def test_chart_is_rendered_in_worker_process(self):
+        image = self.renderer().render(self.changes)
+        self.assertTrue(image.startswith(b'\x89PNG'))
+
+    def test_all_workers_are_started(self):
+        renderer = self.renderer(workers=2)
+        pids = renderer.start()
+        self.assertEqual(len(pids), 2)
+        self.assertEqual(self.renderer(workers=0).start(), set())
+
+    @override_settings(CHART_RENDER_WARM_UP=False)
+    def test_warm_up_can_be_disabled(self):
+        self.assertIsNone(rendering.start_renderer())
+
+    def test_inline_rendering(self):
+        image = self.renderer(workers=0).render(self.changes)
+        self.assertTrue(image.startswith(b'\x89PNG'))
+
+    def test_full_queue_is_rejected(self):
+        renderer = self.renderer(max_pending=1)
+        first = renderer.submit(time.sleep, 1)
+        with self.assertRaises(rendering.RenderUnavailable):
+            renderer.submit(time.sleep, 0)
+        first.result()
+
+    def test_slow_chart_times_out(self):
+        renderer = self.renderer()
+        renderer.run(time.sleep, 0)
+        renderer.timeout = 0.1
+        with self.assertRaises(rendering.RenderUnavailable):
+            renderer.run(time.sleep, 2)
+
+
+class TestSeriesApi(TestCase):
+
+    params = {'bd': 1, 'bm': 4, 'by': 2024, 'ed': 30, 'em': 4, 'ey': 2024}
+
+    def setUp(self):
+        reset_caches()
+        self.client = Client()
+        CountryCodes.objects.create(country='США', currency='Доллар США', code='USD', number='840')
+        CountryCodes.objects.create(country='Антарктида', currency='', code='AQD', number='000')
+        for day in range(1, 31):
+            create_rates(datetime.date(2024, 4, day), USD=100.0 * 1.01 ** day)
+        RateRollup.refresh(['USD'], datetime.date(2024, 4, 1), datetime.date(2024, 4, 30))
+        RatesCoverage.objects.create(currency_code='USD', start_date=datetime.date(2024, 4, 1),
+                                     end_date=datetime.date(2024, 4, 30))
+
+    def test_series_are_returned_as_json(self):
+        response = self.client.get(reverse('countries_rates_series'),
+                                   {**self.params, 'countries': ['США', 'Антарктида']})
+        data = response.json()
+
+        self.assertEqual(data['not_exists'], ['Антарктида'])
+        self.assertEqual(len(data['dates']), 30)
+        self.assertIsNone(data['series']['США'][0])
+        self.assertAlmostEqual(data['series']['США'][1], 1.0)
+
+    def test_long_series_are_downsampled(self):
+        response = self.client.get(reverse('countries_rates_series'),
+                                   {**self.params, 'countries': ['США'], 'max_points': 7})
+        data = response.json()
+
+        # Недели 1-7, 8-14, 15-21, 22-28 и неполная 29-30 апреля
+        self.assertEqual(len(data['dates']), 5)
+        self.assertEqual(data['dates'][0], '2024-04-07')
+        self.assertEqual(data['dates'][-1], '2024-04-30')
+        for value in data['series']['США']:
+            self.assertAlmostEqual(value, 1.0)
+
+    def test_graph_page_draws_in_browser_by_default(self):
+        response = self.client.post(reverse('coutries_and_rates'), {**self.params, 'countries': ['США']})
+        self.assertEqual(response.context['mode'], 'browser')
+        self.assertContains(response, 'data-series-url')
+
+        response = self.client.post(reverse('coutries_and_rates'),
+                                    {**self.params, 'countries': ['США'], 'mode': 'png'})
+        self.assertContains(response, reverse('chart'))
+        self.assertNotContains(response, 'data-series-url')
+
+
+class TestRateStore(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(RATE_STORE_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        reset_caches()
+        create_rates(datetime.date(2024, 4, 1), USD=90.0, EUR=99.0)
+        create_rates(datetime.date(2024, 4, 3), USD=92.0)
+        create_rates(datetime.date(2024, 4, 5), EUR=98.0)
+
+    def test_layout(self):
+        self.assertIsNone(ratestore.get_store())
+        ratestore.rebuild()
+        store = ratestore.get_store()
+
+        self.assertEqual(store.currencies, ['EUR', 'USD'])
+        self.assertEqual(store.days.dtype, np.int32)
+        self.assertEqual(store.days.tolist(), [datetime.date(2024, 4, day).toordinal() for day in (1, 3, 5)])
+        self.assertTrue(store.columns[0].flags.c_contiguous)
+        days, rates = store.series('USD', datetime.date(2024, 4, 2), datetime.date(2024, 4, 5))
+        self.assertEqual(days.tolist(), [datetime.date(2024, 4, day).toordinal() for day in (3, 5)])
+        np.testing.assert_array_equal(rates, [92.0, np.nan])
+        self.assertIsInstance(rates.base, np.memmap)
+
+    def test_get_rates_reads_store_without_sql(self):
+        start, end = datetime.date(2024, 4, 1), datetime.date(2024, 4, 4)
+        expected = services.get_rates(start, end, ['USD', 'EUR'], fetch_missing=False)
+        ratestore.rebuild()
+        self.assertIsNotNone(ratestore.get_store())
+        # Версия данных уже прочитана в пределах RATE_STORE_VERSION_TTL
+        with self.assertNumQueries(0):
+            df = services.get_rates(start, end, ['USD', 'EUR'], fetch_missing=False)
+        pd.testing.assert_frame_equal(df, expected)
+
+    def test_version_changed_by_other_process_is_seen_after_ttl(self):
+        ratestore.rebuild()
+        self.assertIsNotNone(ratestore.get_store())
+        # Так другой процесс фиксирует новые курсы
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {DataVersion._meta.db_table} SET version = version + 1 WHERE name = %s',
+                           [versions.RATES_VERSION_KEY])
+        self.assertIsNotNone(ratestore.get_store())
+        with override_settings(RATE_STORE_VERSION_TTL=0):
+            self.assertIsNone(ratestore.get_store())
+
+    def test_header_overflow_is_rejected(self):
+        with patch.object(ratestore, 'HEADER_SIZE', 64), self.assertRaises(ValueError):
+            ratestore.rebuild()
+
+    def test_stale_store_is_not_used(self):
+        start, end = datetime.date(2024, 4, 1), datetime.date(2024, 4, 6)
+        ratestore.rebuild()
+        services.save_rates(pd.DataFrame([{'currency_code': 'USD', 'date': end, 'rate': 95.0}]))
+        self.assertIsNone(ratestore.get_store())
+        self.assertEqual(services.get_rates(start, end, ['USD'], fetch_missing=False)['USD'].iloc[-1], 95.0)
+
+        # Изменения мимо save_rates (админка, loaddata) тоже делают хранилище устаревшим
+        ratestore.ensure_built()
+        self.assertIsNotNone(ratestore.get_store())
+        rate = CurrencyRates.objects.get(currency_code='USD', date=end)
+        rate.rate = 96.0
+        rate.save()
+        self.assertIsNone(ratestore.get_store())
+        self.assertEqual(services.get_rates(start, end, ['USD'], fetch_missing=False)['USD'].iloc[-1], 96.0)
+
+    @patch('currencies_by_country.scrapers.scrape_rates')
+    def test_rebuilt_once_per_sync(self, scrape_rates):
+        scrape_rates.side_effect = lambda start, end, codes: scraped_rates(
+            codes, [{'currency_code': code, 'date': end, 'rate': 95.0} for code in codes])
+        RatesCoverage.objects.create(currency_code='USD', start_date=datetime.date(2024, 4, 3),
+                                     end_date=datetime.date(2024, 4, 4))
+
+        with patch.object(ratestore, 'rebuild', wraps=ratestore.rebuild) as rebuild, \
+                self.captureOnCommitCallbacks(execute=True):
+            gaps = services.sync_missing_rates(datetime.date(2024, 4, 1), datetime.date(2024, 4, 6), ['USD'])
+
+        self.assertEqual(len(gaps), 2)
+        rebuild.assert_called_once()
+        self.assertEqual(len(ratestore.get_store().days), 5)
+
+
+class TestCrossRates(TestCase):
+
+    def setUp(self):
+        reset_caches()
+        create_rates(datetime.date(2024, 4, 1), USD=90.0, EUR=99.0)
+        create_rates(datetime.date(2024, 4, 2), USD=92.0, EUR=98.0)
+        create_rates(datetime.date(2024, 4, 3), USD=100.0)
+
+    def test_cross_matrix(self):
+        matrix = crossrates.cross_matrix(np.array([[1.0, 90.0, 99.0]]))
+        self.assertEqual(matrix.shape, (1, 3, 3))
+        np.testing.assert_allclose(np.diagonal(matrix[0]), 1.0)
+        self.assertAlmostEqual(matrix[0, 0, 1], 90.0)
+        self.assertAlmostEqual(matrix[0, 1, 2], 1.1)
+
+    def test_pair_over_interval(self):
+        df = crossrates.get_cross_rates('USD', 'EUR', datetime.date(2024, 4, 1), datetime.date(2024, 4, 3))
+        self.assertEqual(list(df.index), [datetime.date(2024, 4, day) for day in (1, 2, 3)])
+        np.testing.assert_allclose(df['rate'].to_numpy(), [1.1, 98 / 92, np.nan])
+        self.assertAlmostEqual(df['change'].iloc[0], 0.0)
+
+        rub = crossrates.get_cross_rates('RUB', 'USD', datetime.date(2024, 4, 2), datetime.date(2024, 4, 3))
+        self.assertEqual(rub['rate'].to_list(), [92.0, 100.0])
+
+    def test_blocks_are_cached_and_joined(self):
+        start, end = datetime.date(2024, 3, 1), datetime.date(2024, 5, 31)
+        self.assertGreater(len(crossrates.blocks(start, end)), 1)
+        crossrates.get_cross_matrix(start, end)
+
+        # Только проверка версии данных
+        with self.assertNumQueries(1):
+            dates, axis, matrix = crossrates.get_cross_matrix(datetime.date(2024, 4, 2), end)
+        self.assertEqual(len(dates), 2)
+        self.assertEqual(matrix.shape, (2, len(axis), len(axis)))
+
+        create_rates(datetime.date(2024, 4, 4), USD=101.0)
+        services.bump_data_version()
+        dates, _, _ = crossrates.get_cross_matrix(datetime.date(2024, 4, 2), end)
+        self.assertEqual(len(dates), 3)
+
+    def test_rates_quoted_per_100_units(self):
+        services.save_rates(scrapers.rates_frame(['JPY'], [scrapers.parse_rates_page(RATES_PER_100.encode('utf-8'))]))
+        df = crossrates.get_cross_rates('JPY', 'USD', datetime.date(2024, 4, 1), datetime.date(2024, 4, 2))
+        np.testing.assert_allclose(df['rate'].to_numpy(), [90 / 0.605, 92 / 0.61])
+
+    def test_api(self):
+        response = self.client.get(reverse('cross_rates'), {'x': 'EUR', 'y': 'USD', 'bd': 1, 'bm': 4,
+                                                            'by': 2024, 'ed': 3, 'em': 4, 'ey': 2024})
+        data = json.loads(response.content)
+        self.assertEqual(data['dates'], ['2024-04-01', '2024-04-02', '2024-04-03'])
+        self.assertAlmostEqual(data['rates'][0], 90 / 99)
+        self.assertIsNone(data['rates'][2])
+
+        response = self.client.get(reverse('cross_rates'), {'x': 'XXX', 'y': 'USD', 'bd': 1, 'bm': 4,
+                                                            'by': 2024, 'ed': 3, 'em': 4, 'ey': 2024})
+        self.assertEqual(response.status_code, 404)
+
+
+class TestExport(TestCase):
+
+    def setUp(self):
+        for day in range(1, 6):
+            create_rates(datetime.date(2024, 4, day), USD=90.0 + day, EUR=100.0 - day)
+
+    def read(self, response) -> bytes:
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_interval_uses_date_index(self):
+        queryset = export.rates_queryset(datetime.date(2024, 4, 2), datetime.date(2024, 4, 3))
+        self.assertIn('rate_date_idx', queryset.explain())
+
+    def test_csv(self):
+        response = self.client.get(reverse('export', args=['rates', 'csv']),
+                                   {'bd': 2, 'bm': 4, 'by': 2024, 'ed': 3, 'em': 4, 'ey': 2024})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(self.read(response).decode().splitlines(), [
+            'currency_code,date,rate',
+            'EUR,2024-04-02,98.0', 'EUR,2024-04-03,97.0',
+            'USD,2024-04-02,92.0', 'USD,2024-04-03,93.0',
+        ])
+
+    @patch.object(export, 'CHUNK_SIZE', 2)
+    def test_changes_are_computed_from_rates(self):
+        response = self.client.get(reverse('export', args=['changes', 'csv']),
+                                   {'bd': 2, 'bm': 4, 'by': 2024, 'ed': 4, 'em': 4, 'ey': 2024,
+                                    'currencies': ['USD']})
+        rows = list(csv.reader(self.read(response).decode().splitlines()))
+        self.assertEqual(rows[0], ['currency', 'date', 'relative_change'])
+        self.assertEqual([row[:2] for row in rows[1:]], [['USD', f'2024-04-0{day}'] for day in (2, 3, 4)])
+        expected = services.get_changes_since(datetime.date(2024, 4, 2), datetime.date(2024, 4, 4), ['USD'])
+        np.testing.assert_allclose([float(row[2]) for row in rows[1:]], expected['USD'])
+
+        response = self.client.get(reverse('export', args=['changes', 'ndjson']))
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['currency'] for row in rows], ['EUR'] * 5 + ['USD'] * 5)
+        self.assertEqual(rows[0]['relative_change'], 0.0)
+
+    @patch.object(export, 'CHUNK_SIZE', 2)
+    def test_ndjson_reads_rows_in_chunks(self):
+        response = self.client.get(reverse('export', args=['rates', 'ndjson']), {'currencies': ['USD']})
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0], {'currency_code': 'USD', 'date': '2024-04-01', 'rate': 91.0})
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+    @patch.object(export, 'CHUNK_SIZE', 3)
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+
+        response = self.client.get(reverse('export', args=['rates', 'parquet']))
+        table = pq.read_table(BytesIO(self.read(response)))
+        self.assertEqual(table.num_rows, 10)
+        self.assertEqual(table.column('rate').to_pylist()[:2], [99.0, 98.0])
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('export', args=['rates', 'xml']))
+        self.assertEqual(response.status_code, 404)
+
+
+class TestMetrics(TestCase):
+
+    def setUp(self):
+        reset_caches()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('main_form'))
+        timing = response['Server-Timing']
+        self.assertTrue(timing.startswith('total;dur='))
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('main_form'))
+        response = self.client.get(reverse('metrics'))
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('currencies_request_seconds_bucket{view="main/",method="GET",status="200",le="+Inf"}',
+                      response.content.decode())
+
+    def test_fetcher_threads_report_to_request(self):
+        server = start_stub_server(self)
+        url = f'http://127.0.0.1:{server.server_port}/currency/rates/'
+        StubFinmarketHandler.delay = 0
+        self.addCleanup(setattr, StubFinmarketHandler, 'delay', 0.3)
+        timings = metrics.RequestTimings()
+        token = metrics.current_request.set(timings)
+        try:
+            fetching.Fetcher().map(scrapers.parse_rates_page, [f'{url}?cur=52100', f'{url}?cur=52170'])
+        finally:
+            metrics.current_request.reset(token)
+
+        self.assertEqual(timings.upstream_requests, 2)
+        self.assertEqual(set(timings.stages), {'upstream', 'parse'})
+        self.assertIn('currencies_upstream_requests_total{host="127.0.0.1:%d",status="200"}' % server.server_port,
+                      metrics.expose())
+
+
+class TestSyncCommand(TestCase):
+
+    @patch('currencies_by_country.scrapers.scrape_country_codes')
+    @patch('currencies_by_country.scrapers.scrape_rates')
+    def test_command_syncs_countries_and_rates(self, scrape_rates, scrape_country_codes):
+        scrape_country_codes.return_value = pd.DataFrame(
+            {'Страна': ['США'], 'Валюта': ['Доллар США'], 'Код': ['USD'], 'Номер': ['840']})
+        scrape_rates.side_effect = lambda start, end, codes: scraped_rates(
+            codes, [{'currency_code': 'USD', 'date': datetime.date.today(), 'rate': 90.0}])
+
+        out = StringIO()
+        call_command('sync_currencies', stdout=out)
+
+        self.assertEqual(CountryCodes.objects.count(), 1)
+        self.assertEqual(CurrencyRates.objects.count(), 1)
+        self.assertEqual(scrape_rates.call_count, 2)
+        self.assertIn('добавлено 1', out.getvalue())
+
+        scrape_rates.reset_mock()
+        call_command('sync_currencies', '--skip-countries', stdout=StringIO())
+        self.assertEqual(scrape_rates.call_count, 1)
+
+    @patch('currencies_by_country.scrapers.scrape_rates')
+    def test_concurrent_run_is_skipped(self, scrape_rates):
+        with locks.db_lock('sync_rates') as acquired:
+            self.assertTrue(acquired)
+            with locks.db_lock('sync_rates') as acquired_again:
+                self.assertFalse(acquired_again)
+
+            out = StringIO()
+            call_command('sync_currencies', '--skip-countries', stdout=out)
+
+        scrape_rates.assert_not_called()
+        self.assertIn('пропуск', out.getvalue())
+        self.assertFalse(SyncLock.objects.exists())
+
+    def test_expired_lock_is_taken_over(self):
+        SyncLock.objects.create(name='sync_rates', token='old',
+                                expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        with locks.db_lock('sync_rates') as acquired:
+            self.assertTrue(acquired)
+
+    @patch('currencies_by_country.fetching.Fetcher.get', side_effect=AssertionError('unexpected HTTP request'))
+    def test_graph_page_does_not_scrape_missing_rates(self, _):
+        reset_caches()
+        CountryCodes.objects.create(country='США', currency='Доллар США', code='USD', number='840')
+        response = self.client.post(reverse('coutries_and_rates'), {
+            'bd': 1, 'bm': 4, 'by': 2024, 'ed': 3, 'em': 4, 'ey': 2024, 'countries': ['США'],
+        })
+        self.assertTrue(response.context['not_synced'])
+
+    @patch('currencies_by_country.scrapers.scrape_rates')
+    def test_interval_ending_today_is_synced(self, scrape_rates):
+        reset_caches()
+        scrape_rates.side_effect = lambda start, end, codes: scraped_rates(
+            codes, [{'currency_code': 'USD', 'date': datetime.date.today(), 'rate': 90.0}])
+        CountryCodes.objects.create(country='США', currency='Доллар США', code='USD', number='840')
+        call_command('sync_currencies', '--skip-countries', '--backfill-days', '7', stdout=StringIO())
+
+        start, today = datetime.date.today() - datetime.timedelta(days=7), datetime.date.today()
+        response = self.client.post(reverse('coutries_and_rates'), {
+            'bd': start.day, 'bm': start.month, 'by': start.year,
+            'ed': today.day, 'em': today.month, 'ey': today.year, 'countries': ['США'],
+        })
+        self.assertFalse(response.context['not_synced'])
+
+
+class TestAsyncViews(TestCase):
+
+    params = {'bd': 1, 'bm': 4, 'by': 2024, 'ed': 3, 'em': 4, 'ey': 2024}
+
+    def setUp(self):
+        reset_caches()
+        CountryCodes.objects.create(country='США', currency='Доллар США', code='USD', number='840')
+        for day in (1, 2, 3):
+            create_rates(datetime.date(2024, 4, day), USD=90.0 + day)
+
+    @patch('currencies_by_country.scrapers.scrape_rates_async')
+    async def test_get_rates_syncs_missing_intervals(self, scrape_rates_async):
+        scrape_rates_async.side_effect = lambda start, end, codes: scraped_rates(
+            codes, [{'currency_code': 'EUR', 'date': datetime.date(2024, 4, 2), 'rate': 100.0}])
+
+        response = await self.async_client.get(reverse('async_currency_rates'), self.params)
+
+        self.assertEqual(scrape_rates_async.call_count, 1)
+        data = json.loads(response.content)
+        self.assertEqual(data['Доллар США'], [91.0, 92.0, 93.0])
+        self.assertEqual(data['ЕВРО'], [None, 100.0, None])
+
+    @patch('currencies_by_country.services.sync_missing_rates_async')
+    async def test_get_rates_can_be_cancelled(self, sync_missing_rates_async):
+        started = asyncio.Event()
+
+        async def sync(*args):
+            started.set()
+            await asyncio.sleep(10)
+        sync_missing_rates_async.side_effect = sync
+
+        task = asyncio.ensure_future(self.async_client.get(reverse('async_currency_rates'), self.params))
+        await started.wait()
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+    @patch('currencies_by_country.services.sync_missing_rates_async', side_effect=RuntimeError('finmarket'))
+    async def test_get_rates_logs_sync_errors(self, sync_missing_rates_async):
+        with self.assertLogs('currencies_by_country.views.scraping', 'ERROR') as logs:
+            response = await self.async_client.get(reverse('async_currency_rates'), self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('finmarket', logs.output[0])
+
+    async def test_chart_is_rendered_off_the_event_loop(self):
+        response = await self.async_client.get(reverse('async_chart'), {**self.params, 'countries': ['США']})
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+
+        not_modified = await self.async_client.get(reverse('async_chart'), {**self.params, 'countries': ['США']},
+                                                   headers={'If-None-Match': response['ETag']})
+        self.assertEqual(not_modified.status_code, 304)
+
+    async def test_graph_page(self):
+        response = await self.async_client.post(reverse('async_coutries_and_rates'),
+                                                {**self.params, 'countries': ['США', 'Антарктида']})
+        self.assertEqual(response.context['not_exists'], ['Антарктида'])
+        self.assertTrue(response.context['not_synced'])
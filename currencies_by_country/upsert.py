@@ -0,0 +1,41 @@
+from typing import NamedTuple
+
+from django.db import models, transaction
+
+
+class UpsertResult(NamedTuple):
+    inserted: int
+    updated: int
+
+
+def bulk_upsert(model: type[models.Model], objs: list[models.Model],
+                unique_fields: list[str], update_fields: list[str],
+                batch_size: int = 500) -> UpsertResult:
+    '''
+    Takes: модель, список несохраненных объектов, уникальные поля,
+    поля для обновления при совпадении уникальных полей
+
+    Returns: UpsertResult с количеством добавленных и обновленных строк
+
+    Записывает объекты через INSERT ... ON CONFLICT DO UPDATE в одной транзакции
+    '''
+    keys = {tuple(getattr(obj, field) for field in unique_fields) for obj in objs}
+    if not keys:
+        return UpsertResult(inserted=0, updated=0)
+
+    lookup = {
+        f'{field}__in': {key[index] for key in keys}
+        for index, field in enumerate(unique_fields)
+    }
+    with transaction.atomic():
+        existing = keys.intersection(
+            model.objects.filter(**lookup).values_list(*unique_fields)
+        )
+        model.objects.bulk_create(
+            objs,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=update_fields,
+        )
+    return UpsertResult(inserted=len(keys) - len(existing), updated=len(existing))
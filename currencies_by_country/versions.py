@@ -0,0 +1,79 @@
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .models import DataVersion
+
+RATES_VERSION_KEY = 'rates_version'
+COUNTRIES_VERSION_KEY = 'countries_version'
+
+# Число обновлений версий в этом процессе: по нему сбрасываются версии,
+# запомненные в памяти процесса (ratestore.current_version)
+local_bumps = 0
+
+
+def data_version(key: str = RATES_VERSION_KEY) -> int:
+    '''
+    Takes: ключ версии (по умолчанию версия данных о курсах)
+
+    Returns: текущая версия данных, 0 - если данные еще не сохранялись
+
+    Версия хранится в таблице DataVersion, поэтому она общая для всех процессов:
+    синхронизация в команде sync_currencies видна всем воркерам
+    '''
+    return DataVersion.objects.filter(name=key).values_list('version', flat=True).first() or 0
+
+
+def chart_version() -> str:
+    '''
+    Returns: версия данных графиков и рядов по странам: версии данных о курсах
+    и списка стран, прочитанные одним запросом
+
+    График страны зависит и от ее курсов, и от того, какой валюте она соответствует
+    в CountryCodes, поэтому ключ графика меняется при изменении любой из них
+    '''
+    keys = (RATES_VERSION_KEY, COUNTRIES_VERSION_KEY)
+    versions = dict(DataVersion.objects.filter(name__in=keys).values_list('name', 'version'))
+    return '-'.join(str(versions.get(key, 0)) for key in keys)
+
+
+def bump_data_version(key: str = RATES_VERSION_KEY, using: str = DEFAULT_DB_ALIAS):
+    '''
+    Takes: ключ версии (по умолчанию версия данных о курсах), БД
+
+    Делает недействительным все, что закэшировано по текущей версии данных.
+    Вызывается в транзакции сохранения данных, поэтому другие процессы видят
+    новую версию одновременно с новыми данными
+    '''
+    global local_bumps
+    local_bumps += 1
+    DataVersion.objects.using(using).bulk_create(
+        [DataVersion(name=key, version=time.time_ns())],
+        update_conflicts=True, unique_fields=['name'], update_fields=['version'],
+    )
+
+
+def countries_changed(sender, **kwargs):
+    '''
+    Обработчик post_save и post_delete CountryCodes: изменения через ORM и админку
+    (не через save_country_codes) тоже обновляют версию списка стран
+    '''
+    bump_data_version(COUNTRIES_VERSION_KEY)
+
+
+def rates_changed(sender, **kwargs):
+    '''
+    Обработчик post_save и post_delete CurrencyRates: курсы, измененные через ORM,
+    админку или loaddata (не через save_rates), тоже обновляют версию данных о курсах,
+    поэтому кэши и хранилище ratestore их не скрывают
+    '''
+    bump_data_version(RATES_VERSION_KEY)
+
+
+def migrated(sender, using: str = DEFAULT_DB_ALIAS, **kwargs):
+    '''
+    Обработчик post_migrate: миграции данных могли изменить курсы,
+    поэтому после migrate обновляется версия данных о курсах
+    '''
+    if DataVersion._meta.db_table in connections[using].introspection.table_names():
+        bump_data_version(RATES_VERSION_KEY, using)
@@ -0,0 +1,38 @@
+'''
+Представления приложения, разбитые по модулям:
+
+validation - проверка дат из параметров запроса
+scraping - скачивание кодов валют и курсов с сайтов
+analytics - страница графика, ряды изменений курсов и выгрузки
+charts - png графики
+pages - форма и метрики
+
+Модули с pandas, numpy, lxml, matplotlib и HTTP клиентами (services, scrapers, charts,
+crossrates) импортируются внутри представлений при первом запросе, поэтому загрузка urls
+(и любой команды manage.py) их не тянет
+'''
+from django.shortcuts import redirect
+
+from .analytics import AnalyticsViews, AsyncAnalyticsViews, graph_context
+from .charts import AsyncChartViews, ChartViews, chart_response, unavailable_response
+from .pages import MainPageForm, Monitoring
+from .scraping import AsyncScrapingViews, ScrapingViews, rates_response
+from .validation import DateValidation
+
+
+class GetterCurrencies(ScrapingViews, AnalyticsViews, ChartViews):
+
+    def redirect_to_main(request):
+        '''
+        Перенаправляет с базового роута на главную страницу с формой
+        '''
+        return redirect("main/")
+
+
+class AsyncGetterCurrencies(AsyncScrapingViews, AsyncAnalyticsViews, AsyncChartViews):
+    '''
+    Асинхронные версии представлений GetterCurrencies для запуска под ASGI.
+    Сайты скачиваются неблокирующим клиентом, БД читается асинхронным ORM,
+    а графики строятся в пуле процессов rendering, поэтому один воркер
+    обслуживает много медленных запросов одновременно
+    '''
@@ -0,0 +1,193 @@
+import datetime
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, JsonResponse, QueryDict, StreamingHttpResponse
+from django.shortcuts import render
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+
+from .. import export, versions
+from ..constants import DEFAULT_MAX_POINTS, tracked_currencies
+from .validation import DateValidation
+
+
+def graph_context(request, start_date: datetime.date, end_date: datetime.date,
+                  not_exists: list[str], not_synced: bool) -> dict:
+    '''
+    Takes: POST запрос формы, даты начала и конца интервала, страны без отслеживаемой валюты,
+    флаг того, что курсы за интервал загружены не полностью
+
+    Returns: контекст страницы graph.html
+    '''
+    selected_countries = request.POST.getlist('countries')
+
+    query = QueryDict(mutable=True)
+    query.setlist('countries', sorted(set(selected_countries)))
+    query.update({'bd': start_date.day, 'bm': start_date.month, 'by': start_date.year,
+                  'ed': end_date.day, 'em': end_date.month, 'ey': end_date.year,
+                  'v': versions.chart_version()})
+    chart_url = f"{reverse('chart')}?{query.urlencode()}"
+    series_url = f"{reverse('countries_rates_series')}?{query.urlencode()}"
+
+    # По умолчанию график рисуется в браузере, png с сервера - по запросу (mode=png)
+    mode = 'png' if request.POST.get('mode') == 'png' else 'browser'
+
+    return {'chart_url': chart_url,
+            'series_url': series_url,
+            'mode': mode,
+            'not_exists': not_exists,
+            'not_synced': not_synced}
+
+
+class AnalyticsViews:
+
+    def get_countries_rates(request):
+        '''
+        Запрашивает коды и курсы валют за определенный период с определенным списком стран
+        и отдает страницу со ссылкой на график относительных изменений курсов
+        '''
+        from .. import services
+
+        start_date, end_date = DateValidation().check_request_interval(request.POST)
+
+        selected_countries = request.POST.getlist('countries')
+        # selected_countries содержит список выбранных стран
+
+        # Коды валют и курсы только читаются из БД, их скачивает команда sync_currencies
+        country_codes, not_exists = services.resolve_countries(selected_countries)
+        not_synced = services.has_missing_rates(start_date, end_date, sorted(set(country_codes.values())))
+
+        return render(request, 'graph.html', graph_context(request, start_date, end_date,
+                                                           not_exists, not_synced))
+
+    def get_countries_rates_series(request) -> JsonResponse:
+        '''
+        Отдает в JSON ряды дневных относительных изменений курсов (%) для стран и интервала
+        из GET параметров. Длинные ряды строятся по недельным или месячным агрегатам,
+        чтобы точек было не больше max_points
+
+        Возвращает JsonResponse с полями dates, series (страна -> значения) и not_exists
+        '''
+        from .. import charts, services
+
+        start_date, end_date = DateValidation().check_request_interval(request.GET)
+        countries = request.GET.getlist('countries')
+        try:
+            max_points = int(request.GET.get('max_points', DEFAULT_MAX_POINTS))
+        except ValueError:
+            raise Http404("max_points should be an integer")
+        if max_points < 1:
+            raise Http404("max_points should be a positive number")
+
+        changes = services.get_relative_changes(countries, start_date, end_date, max_points)
+        changes = changes.astype(object).where(changes.notna(), None)
+
+        response = JsonResponse({
+            'dates': [date.isoformat() for date in changes.index],
+            'series': changes.to_dict(orient='list'),
+            'not_exists': services.resolve_countries(countries)[1],
+        })
+        patch_cache_control(response, public=True,
+                            max_age=charts.response_max_age(request.GET, versions.chart_version()))
+        return response
+
+    def get_changes_since(request) -> JsonResponse:
+        '''
+        Отдает в JSON относительные изменения курсов (%) от начальной даты интервала
+        из GET параметров для валют currencies (ISO-коды, по умолчанию все отслеживаемые).
+        Изменения считаются на лету для любой базовой даты и не записываются в БД
+
+        Возвращает JsonResponse с полями base_date, dates и series (ISO-код -> значения)
+        '''
+        from .. import charts, services
+
+        start_date, end_date = DateValidation().check_request_interval(request.GET)
+        tracked = tracked_currencies()
+        currency_codes = request.GET.getlist('currencies') or list(tracked)
+        if not set(currency_codes) <= set(tracked):
+            raise Http404("currencies should be tracked ISO codes")
+
+        changes = services.get_changes_since(start_date, end_date, currency_codes)
+        changes = changes.astype(object).where(changes.notna(), None)
+
+        response = JsonResponse({
+            'base_date': start_date.isoformat(),
+            'dates': [date.isoformat() for date in changes.index],
+            'series': changes.to_dict(orient='list'),
+        })
+        patch_cache_control(response, public=True,
+                            max_age=charts.response_max_age(request.GET, versions.data_version()))
+        return response
+
+    def get_cross_rates(request) -> JsonResponse:
+        '''
+        Отдает в JSON кросс-курс валют x и y (ISO-коды отслеживаемых валют или RUB)
+        за интервал из GET параметров: сколько x стоит одна единица y на каждую дату
+
+        Возвращает JsonResponse с полями currency, per, dates, rates и changes
+        (относительное изменение кросс-курса от начала интервала, %)
+        '''
+        from .. import charts, crossrates
+
+        start_date, end_date = DateValidation().check_request_interval(request.GET)
+        currency, per = request.GET.get('x'), request.GET.get('y')
+        axis = crossrates.currency_axis()
+        if currency not in axis or per not in axis:
+            raise Http404("x and y should be tracked ISO codes or RUB")
+
+        df = crossrates.get_cross_rates(currency, per, start_date, end_date)
+        df = df.astype(object).where(df.notna(), None)
+
+        response = JsonResponse({
+            'currency': currency,
+            'per': per,
+            'dates': [date.isoformat() for date in df.index],
+            'rates': df['rate'].to_list(),
+            'changes': df['change'].to_list(),
+        })
+        patch_cache_control(response, public=True,
+                            max_age=charts.response_max_age(request.GET, versions.data_version()))
+        return response
+
+    def export_table(request, table: str, fmt: str) -> StreamingHttpResponse:
+        '''
+        Потоково выгружает таблицу курсов (rates) или относительных изменений курсов
+        от начала интервала (changes, считаются на лету) в формате csv, ndjson или parquet
+        (нужен pyarrow). Интервал bd..ey и валюты currencies (ISO-коды) необязательны,
+        без них выгружаются все курсы
+        '''
+        if table not in export.EXPORT_TABLES or fmt not in export.EXPORT_FORMATS:
+            raise Http404("Unknown export table or format")
+        start_date = end_date = None
+        if any(name in request.GET for name in ('bd', 'bm', 'by', 'ed', 'em', 'ey')):
+            start_date, end_date = DateValidation().check_request_interval(request.GET)
+
+        columns, rows = export.export_rows(table, start_date, end_date, request.GET.getlist('currencies'))
+        try:
+            stream = export.export_stream(fmt, columns, rows)
+        except export.ExportUnavailable as e:
+            return HttpResponse(str(e), status=501, content_type='text/plain; charset=utf-8')
+
+        response = StreamingHttpResponse(stream, content_type=export.EXPORT_FORMATS[fmt])
+        response.headers['Content-Disposition'] = f'attachment; filename="{table}.{fmt}"'
+        return response
+
+
+class AsyncAnalyticsViews:
+
+    async def get_countries_rates(request):
+        '''
+        Асинхронная версия GetterCurrencies.get_countries_rates
+        '''
+        from .. import services
+
+        start_date, end_date = DateValidation().check_request_interval(request.POST)
+        selected_countries = request.POST.getlist('countries')
+
+        country_codes, not_exists = await sync_to_async(services.resolve_countries)(selected_countries)
+        not_synced = await sync_to_async(services.has_missing_rates)(
+            start_date, end_date, sorted(set(country_codes.values())))
+
+        context = await sync_to_async(graph_context)(request, start_date, end_date,
+                                                     not_exists, not_synced)
+        return render(request, 'graph.html', context)
@@ -0,0 +1,79 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+
+from .. import rendering
+from .validation import DateValidation
+
+
+def chart_response(key: str, image: bytes | None, max_age: int) -> HttpResponse:
+    '''
+    Takes: ключ графика, png (None, если у клиента актуальная версия),
+    время хранения ответа в браузере в секундах
+
+    Returns: ответ с png или 304 и заголовками ETag и Cache-Control
+    '''
+    if image is None:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(image, content_type='image/png')
+    response.headers['ETag'] = f'"{key}"'
+    patch_cache_control(response, public=True, max_age=max_age)
+    return response
+
+
+def unavailable_response(error: Exception) -> HttpResponse:
+    '''
+    Takes: ошибка построения графика
+
+    Returns: ответ 503 с заголовком Retry-After
+    '''
+    response = HttpResponse(str(error), status=503, content_type='text/plain; charset=utf-8')
+    response.headers['Retry-After'] = '5'
+    return response
+
+
+class ChartViews:
+
+    def get_chart(request) -> HttpResponse:
+        '''
+        Отдает png график относительных изменений курсов для стран и интервала из GET параметров.
+        График берется из кэша, ETag меняется вместе с общими для всех процессов версиями
+        данных о курсах и списка стран. Если пул построения графиков перегружен, отвечает 503
+        '''
+        from .. import charts, versions
+
+        start_date, end_date = DateValidation().check_request_interval(request.GET)
+        countries = request.GET.getlist('countries')
+
+        version = versions.chart_version()
+        key = charts.chart_key(countries, start_date, end_date, version)
+        max_age = charts.response_max_age(request.GET, version)
+        if f'"{key}"' in request.headers.get('If-None-Match', ''):
+            return chart_response(key, None, max_age)
+        try:
+            return chart_response(*charts.get_chart(countries, start_date, end_date, key), max_age)
+        except rendering.RenderUnavailable as e:
+            return unavailable_response(e)
+
+
+class AsyncChartViews:
+
+    async def get_chart(request) -> HttpResponse:
+        '''
+        Асинхронная версия GetterCurrencies.get_chart, ожидание пула процессов не блокирует event loop
+        '''
+        from .. import charts, versions
+
+        start_date, end_date = DateValidation().check_request_interval(request.GET)
+        countries = request.GET.getlist('countries')
+
+        version = await sync_to_async(versions.chart_version)()
+        key = charts.chart_key(countries, start_date, end_date, version)
+        max_age = charts.response_max_age(request.GET, version)
+        if f'"{key}"' in request.headers.get('If-None-Match', ''):
+            return chart_response(key, None, max_age)
+        try:
+            return chart_response(*await charts.get_chart_async(countries, start_date, end_date, key), max_age)
+        except rendering.RenderUnavailable as e:
+            return unavailable_response(e)
@@ -0,0 +1,32 @@
+from django.http import HttpResponse
+from django.views.generic import TemplateView
+from django.shortcuts import render
+
+from .. import metrics
+
+
+class Monitoring:
+
+    def metrics(request) -> HttpResponse:
+        '''
+        Отдает метрики процесса в текстовом формате Prometheus: время запросов
+        и этапов обработки, число SQL запросов, запросы к сайтам
+        '''
+        return HttpResponse(metrics.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class MainPageForm(TemplateView):
+
+    template_name = 'main_form.html'
+
+    def main_form(request):
+        '''
+        Определяет форму, которая принимает страны и интервал дат, а затем отправляет запрос на get_countries_rates
+        '''
+        from .. import services
+
+        all_countries = services.get_countries()
+
+        return render(request,
+                      'main_form.html',
+                      context={'countries': all_countries})
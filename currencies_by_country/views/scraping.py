@@ -0,0 +1,102 @@
+import logging
+from typing import TYPE_CHECKING
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+
+from ..constants import tracked_currencies
+from .validation import DateValidation
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def rates_response(df: 'pd.DataFrame') -> JsonResponse:
+    '''
+    Takes: DataFrame курсов из services.get_rates
+
+    Returns: JsonResponse с полем Дата и курсами, названными как валюты на finmarket.ru
+    '''
+    df = df.astype(object).where(df.notna(), None)
+    tracked = tracked_currencies()
+    course_to_rub = {
+        tracked.get(column, column): values
+        for column, values in df.to_dict(orient='list').items()
+    }
+    return JsonResponse(course_to_rub)
+
+
+class ScrapingViews:
+
+    def get_currency_of_country(request) -> JsonResponse:
+        '''
+        Собирает с iban.ru информацию о кодах валют стран
+        и синхранизирует их в БД в таблице CountryCodes
+        '''
+        from .. import scrapers, services
+
+        df = scrapers.scrape_country_codes()
+        dict_country_currency = df.to_dict()
+
+        try:
+            services.save_country_codes(df)
+        except Exception:
+            logger.exception('Ошибка [get_currency_of_country]')
+
+        return JsonResponse(dict_country_currency)
+
+    def get_rates(request) -> JsonResponse:
+        '''
+        Собирает с finmarket.ru информацию о курсах валют
+        и синхранизирует их в БД в таблице CountryCodes
+        '''
+        from .. import services
+
+        start_date, end_date = DateValidation().check_request_interval(request.GET)
+
+        # Скачиваются только еще не скачанные части интервала
+        try:
+            services.sync_missing_rates(start_date, end_date)
+        except Exception:
+            logger.exception('Ошибка [get_rates]')
+
+        df = services.get_rates(start_date, end_date, fetch_missing=False)
+        return rates_response(df)
+
+
+class AsyncScrapingViews:
+
+    async def get_currency_of_country(request) -> JsonResponse:
+        '''
+        Асинхронная версия GetterCurrencies.get_currency_of_country
+        '''
+        from .. import scrapers, services
+
+        df = await scrapers.scrape_country_codes_async()
+        dict_country_currency = df.to_dict()
+
+        try:
+            await sync_to_async(services.save_country_codes)(df)
+        except Exception:
+            logger.exception('Ошибка [get_currency_of_country]')
+
+        return JsonResponse(dict_country_currency)
+
+    async def get_rates(request) -> JsonResponse:
+        '''
+        Асинхронная версия GetterCurrencies.get_rates
+        '''
+        from .. import services
+
+        start_date, end_date = DateValidation().check_request_interval(request.GET)
+
+        # Скачиваются только еще не скачанные части интервала
+        try:
+            await services.sync_missing_rates_async(start_date, end_date)
+        except Exception:
+            logger.exception('Ошибка [get_rates]')
+
+        df = await sync_to_async(services.get_rates)(start_date, end_date, fetch_missing=False)
+        return rates_response(df)
@@ -0,0 +1,97 @@
+import datetime
+import pytz
+from django.http import Http404, QueryDict
+
+class DateValidation:
+    tz = pytz.timezone('Europe/Moscow')
+
+    def check_day(self, day: int) -> int:
+        '''
+        Takes: целочисленный день
+
+        Returns: целочисленный день, если он между 1 и 31, иначе вызывает ошибку
+        '''
+        if day < 1 or day > 31:
+            raise Http404("Day should be between 1 and 31")
+        return day
+
+    def check_month(self, month: int) -> int:
+        '''
+        Takes: целочисленный месяц
+
+        Returns: целочисленный месяц, если он между 1 и 12, иначе вызывает ошибку
+        '''
+        if month < 1 or month > 12:
+            raise Http404("Month should be between 1 and 12")
+        return month
+
+    def check_year(self, year: int) -> int:
+        '''
+        Takes: целочисленный месяц
+
+        Returns: целочисленный месяц, если он между 1 и 12, иначе вызывает ошибку
+        '''
+        current_year = datetime.datetime.now(self.tz).date().year
+        if year < 1 or year > current_year:
+            raise Http404("Year should be a positive number not greater than the current year")
+        return year
+
+    def check_all_date(self, day: int, month: int, year: int):
+        '''
+        Takes: целочисленный день, месяц, год
+
+        Returns: None
+
+        Проверяет дату на ее существование и больше ли она текущей даты,
+        иначе возвращает ошибку
+        '''
+        try:
+            date = datetime.date(year, month, day)
+        except ValueError:
+            raise Http404("Incorrect data")
+        if date > datetime.datetime.now(self.tz).date():
+            raise Http404("Input date greater then now date")
+
+    def check_interval(self, day_start: int, month_start: int, year_start: int,
+                       day_end: int, month_end: int, year_end: int):
+        '''
+        Takes: целочисленный день, месяц, год дат начала и конца интервала
+
+        Returns: None
+
+        Проверяет, находится ли интервал от 0 до 2 лет,
+        иначе возвращает ошибку
+        '''
+        start_date = datetime.date(year_start, month_start, day_start)
+        end_date = datetime.date(year_end, month_end, day_end)
+
+        if (end_date - start_date).days > 2 * 365:
+            raise Http404("Interval must be <= 2 years")
+        elif (end_date - start_date).days < 0:
+            raise Http404("End date must be >= start date")
+
+    def check_request_interval(self, params: QueryDict) -> tuple[datetime.date, datetime.date]:
+        '''
+        Takes: параметры запроса bd, bm, by, ed, em, ey
+
+        Returns: даты начала и конца интервала, прошедшие все проверки
+        '''
+        try:
+            bd, bm, by, ed, em, ey = (int(params.get(name))
+                                      for name in ('bd', 'bm', 'by', 'ed', 'em', 'ey'))
+        except (TypeError, ValueError):
+            raise Http404("Incorrect data")
+
+        bd = self.check_day(bd)
+        bm = self.check_month(bm)
+        by = self.check_year(by)
+        self.check_all_date(bd, bm, by)
+
+        ed = self.check_day(ed)
+        em = self.check_month(em)
+        ey = self.check_year(ey)
+        self.check_all_date(ed, em, ey)
+
+        self.check_interval(bd, bm, by,
+                            ed, em, ey)
+        return datetime.date(by, bm, bd), datetime.date(ey, em, ed)